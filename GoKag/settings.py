@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "rest_framework_simplejwt.token_blacklist",
@@ -131,6 +132,21 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory by default, set a shared backend (file based, memcached...)
+# when running several workers so cache invalidation reaches all of them
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", "gokag"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -188,6 +204,42 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 2,
 }
 
+# Upload
+# Number of answers inserted per bulk_create query when importing datasets
+
+UPLOAD_ANSWER_BATCH_SIZE = int(
+    os.environ.get("UPLOAD_ANSWER_BATCH_SIZE", "1000")
+)
+
+# Number of processes classifying the columns of an uploaded sheet, 1 runs
+# the classification on the request thread
+
+UPLOAD_INFERENCE_WORKERS = int(os.environ.get("UPLOAD_INFERENCE_WORKERS", "1"))
+
+# Inferred column types are kept in an in-process LRU cache of
+# UPLOAD_SCHEMA_CACHE_SIZE columns and, when UPLOAD_SCHEMA_CACHE names one
+# of CACHES, in that cache for UPLOAD_SCHEMA_CACHE_TIMEOUT seconds
+
+UPLOAD_SCHEMA_CACHE = os.environ.get("UPLOAD_SCHEMA_CACHE", "")
+
+UPLOAD_SCHEMA_CACHE_SIZE = int(
+    os.environ.get("UPLOAD_SCHEMA_CACHE_SIZE", "1024")
+)
+
+UPLOAD_SCHEMA_CACHE_TIMEOUT = int(
+    os.environ.get("UPLOAD_SCHEMA_CACHE_TIMEOUT", "86400")
+)
+
+# A running upload job beats every UPLOAD_JOB_HEARTBEAT_INTERVAL seconds,
+# run_upload_jobs fails the jobs without a beat for UPLOAD_JOB_TIMEOUT
+# seconds, left so by a worker that died while processing them
+
+UPLOAD_JOB_HEARTBEAT_INTERVAL = int(
+    os.environ.get("UPLOAD_JOB_HEARTBEAT_INTERVAL", "60")
+)
+
+UPLOAD_JOB_TIMEOUT = int(os.environ.get("UPLOAD_JOB_TIMEOUT", "600"))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -79,3 +79,21 @@ class AnswerNotEnoughException(APIException):
     status_code = 400
     default_detail = "Answer not enough number of questions."
     default_code = "answer_not_enough"
+
+
+class AnswerNotFoundException(APIException):
+    status_code = 404
+    default_detail = "Answer not found."
+    default_code = "answer_not_found"
+
+
+class ColumnTypeMismatchException(APIException):
+    status_code = 400
+    default_detail = "Data type is not comfortable."
+    default_code = "column_type_mismatch"
+
+
+class UploadJobNotFoundException(APIException):
+    status_code = 404
+    default_detail = "Upload job not found."
+    default_code = "upload_job_not_found"
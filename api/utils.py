@@ -3,6 +3,8 @@ import os
 from functools import wraps
 
 import jwt
+from django.db.models import F, Func, IntegerField, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import status
 from rest_framework.exceptions import APIException
 from rest_framework.response import Response
@@ -54,6 +56,23 @@ def is_valid_json(json_str):
         return False
 
 
+def count_subquery(queryset, field="pk"):
+    """
+    Correlated subquery counting the distinct values of `field` in a
+    queryset (filtered with OuterRef), to be used in annotate()
+    """
+    count = Func(
+        F(field),
+        function="COUNT",
+        template="%(function)s(DISTINCT %(expressions)s)",
+        output_field=IntegerField(),
+    )
+    return Coalesce(
+        Subquery(queryset.order_by().annotate(count=count).values("count")),
+        0,
+    )
+
+
 def try_except_wrapper(fn):
     @wraps(fn)
     def wrapped(*args, **kwargs):
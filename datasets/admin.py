@@ -1,4 +1,7 @@
-from .models import Answer
+from .models import Answer, AnswerStatistics, ResponseCounter, Submission
 from django.contrib import admin
 
 admin.site.register(Answer)
+admin.site.register(AnswerStatistics)
+admin.site.register(ResponseCounter)
+admin.site.register(Submission)
@@ -0,0 +1,44 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from datasets.models import Answer, ResponseCounter
+
+
+def lock_response_counter(questionnaire_id):
+    """
+    Response code counter of a questionnaire, locked with SELECT ... FOR
+    UPDATE until the end of the current transaction.
+
+    A missing counter is created from the highest code already used.
+    """
+    counters = ResponseCounter.objects.select_for_update().filter(
+        questionnaire_id=questionnaire_id
+    )
+    counter = counters.first()
+    if counter is not None:
+        return counter
+
+    last_code = Answer.objects.filter(
+        questionnaire_id=questionnaire_id
+    ).aggregate(last_code=Max("code"))["last_code"]
+    try:
+        with transaction.atomic():
+            ResponseCounter.objects.create(
+                questionnaire_id=questionnaire_id, last_code=last_code or 0
+            )
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        pass
+    return counters.get()
+
+
+def allocate_codes(questionnaire_id, count=1):
+    """
+    Reserve `count` consecutive response codes and return the first one
+    """
+    with transaction.atomic():
+        counter = lock_response_counter(questionnaire_id)
+        first_code = counter.last_code + 1
+        counter.last_code += count
+        counter.save(update_fields=["last_code"])
+    return first_code
@@ -0,0 +1,64 @@
+import csv
+import tempfile
+
+from openpyxl import Workbook
+
+from datasets.models import Submission
+from questionnaire.models import Question
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer, write() returns the line instead of
+    storing it so rows can be yielded to a StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_dataset_rows(questionnaire):
+    """
+    Yield the header (question labels by sequence) then one row of values
+    per submission, reading them with a server-side iterator.
+    """
+    questions = list(
+        Question.objects.filter(questionnaire=questionnaire)
+        .order_by("sequence")
+        .values_list("key", "label")
+    )
+    yield [label for _, label in questions]
+
+    keys = [str(key) for key, _ in questions]
+    submissions = (
+        Submission.objects.filter(questionnaire=questionnaire)
+        .order_by("code")
+        .values_list("values", flat=True)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for values in submissions:
+        yield [values.get(key) for key in keys]
+
+
+def stream_csv(questionnaire):
+    writer = csv.writer(Echo())
+    for row in iter_dataset_rows(questionnaire):
+        yield writer.writerow(row)
+
+
+def write_xlsx(questionnaire):
+    """
+    Write the dataset into a write-only workbook backed by a temporary
+    file and return that file, rewound, ready to be streamed.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in iter_dataset_rows(questionnaire):
+        sheet.append(row)
+
+    file = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from datasets.submissions import rebuild_submissions
+from questionnaire.models import Questionnaire
+
+
+class Command(BaseCommand):
+    help = "Recompute the submission rows from the answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "questionnaires",
+            nargs="*",
+            type=int,
+            help="Ids of the questionnaires to rebuild (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        questionnaires = Questionnaire.objects.all()
+        if options["questionnaires"]:
+            questionnaires = questionnaires.filter(
+                pk__in=options["questionnaires"]
+            )
+
+        for questionnaire in questionnaires.iterator():
+            rebuild_submissions([questionnaire])
+            self.stdout.write(f"Rebuilt submissions of {questionnaire.slug}")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_statistics(apps, schema_editor):
+    Answer = apps.get_model("datasets", "Answer")
+    AnswerStatistics = apps.get_model("datasets", "AnswerStatistics")
+
+    rows = (
+        Answer.objects.order_by()
+        .values("questionnaire", "question_key", "value")
+        .annotate(count=Count("id"))
+    )
+    AnswerStatistics.objects.bulk_create(
+        [
+            AnswerStatistics(
+                questionnaire_id=row["questionnaire"],
+                question_key=row["question_key"],
+                value=row["value"],
+                count=row["count"],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0023_alter_questionnaire_thumb"),
+        ("datasets", "0012_alter_answer_options_remove_answer_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnswerStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("question_key", models.UUIDField()),
+                ("value", models.TextField(blank=True, null=True)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "questionnaire",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answer_statistics",
+                        to="questionnaire.questionnaire",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "answer_statistics",
+                "ordering": ["questionnaire", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["question_key"],
+                        name="question_key_statistics_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_counters(apps, schema_editor):
+    Answer = apps.get_model("datasets", "Answer")
+    ResponseCounter = apps.get_model("datasets", "ResponseCounter")
+
+    rows = (
+        Answer.objects.order_by()
+        .values("questionnaire")
+        .annotate(last_code=Max("code"))
+        .filter(last_code__isnull=False)
+    )
+    ResponseCounter.objects.bulk_create(
+        [
+            ResponseCounter(
+                questionnaire_id=row["questionnaire"],
+                last_code=row["last_code"],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0026_questionnaire_tag_set"),
+        ("datasets", "0013_answerstatistics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResponseCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_code", models.IntegerField(default=0)),
+                (
+                    "questionnaire",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="response_counter",
+                        to="questionnaire.questionnaire",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "response_counter",
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
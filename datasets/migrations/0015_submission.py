@@ -0,0 +1,104 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:52
+
+from itertools import groupby
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_submissions(apps, schema_editor):
+    Answer = apps.get_model("datasets", "Answer")
+    Submission = apps.get_model("datasets", "Submission")
+
+    answers = (
+        Answer.objects.filter(code__isnull=False)
+        .order_by("questionnaire_id", "code")
+        .values_list(
+            "questionnaire_id",
+            "code",
+            "answer_by_id",
+            "id",
+            "question_key",
+            "value",
+        )
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for (questionnaire_id, code), group in groupby(
+        answers, key=lambda answer: answer[:2]
+    ):
+        submission = Submission(
+            questionnaire_id=questionnaire_id,
+            code=code,
+            values={},
+            answer_ids={},
+        )
+        for _, _, answer_by_id, answer_id, question_key, value in group:
+            submission.answer_by_id = answer_by_id
+            submission.values[str(question_key)] = value
+            submission.answer_ids[str(question_key)] = answer_id
+        batch.append(submission)
+
+        if len(batch) >= 1000:
+            Submission.objects.bulk_create(batch)
+            batch = []
+
+    Submission.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0026_questionnaire_tag_set"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("datasets", "0014_responsecounter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Submission",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("code", models.IntegerField()),
+                ("values", models.JSONField(default=dict)),
+                ("answer_ids", models.JSONField(default=dict)),
+                ("create_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "answer_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="submissions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "questionnaire",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="submissions",
+                        to="questionnaire.questionnaire",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "submission",
+                "ordering": ["questionnaire_id", "code"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="submission",
+            constraint=models.UniqueConstraint(
+                fields=("questionnaire", "code"), name="submission_code_unique"
+            ),
+        ),
+        migrations.RunPython(populate_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0026_questionnaire_tag_set"),
+        ("datasets", "0015_submission"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="answer",
+            options={"ordering": ["questionnaire_id", "code"]},
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["questionnaire", "code"],
+                name="answer_questionnaire_code_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["questionnaire", "question_key", "code"],
+                name="answer_question_key_idx",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="questionnaire_answer_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="question_key_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="answer",
+            name="code_idx",
+        ),
+        migrations.AlterField(
+            model_name="answer",
+            name="questionnaire",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="answers",
+                to="questionnaire.questionnaire",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="questionnaire",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="submissions",
+                to="questionnaire.questionnaire",
+            ),
+        ),
+    ]
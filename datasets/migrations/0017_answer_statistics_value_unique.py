@@ -0,0 +1,53 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:15
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def merge_duplicate_statistics(apps, schema_editor):
+    AnswerStatistics = apps.get_model("datasets", "AnswerStatistics")
+
+    kept = {}
+    to_update = {}
+    to_delete = []
+    for statistic in AnswerStatistics.objects.order_by("id").iterator():
+        key = (
+            statistic.questionnaire_id,
+            statistic.question_key,
+            statistic.value,
+        )
+        first = kept.setdefault(key, statistic)
+        if first is not statistic:
+            first.count += statistic.count
+            to_update[first.id] = first
+            to_delete.append(statistic.id)
+
+    AnswerStatistics.objects.bulk_update(
+        to_update.values(), ["count"], batch_size=1000
+    )
+    AnswerStatistics.objects.filter(id__in=to_delete).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("datasets", "0016_answer_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_statistics, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="answerstatistics",
+            constraint=models.UniqueConstraint(
+                models.F("questionnaire"),
+                models.F("question_key"),
+                django.db.models.functions.comparison.Coalesce(
+                    django.db.models.functions.text.MD5("value"),
+                    models.Value(""),
+                ),
+                name="answer_statistics_value_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:17
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def populate_create_at(apps, schema_editor):
+    Answer = apps.get_model("datasets", "Answer")
+    Submission = apps.get_model("datasets", "Submission")
+
+    first_answers = (
+        Answer.objects.filter(
+            questionnaire_id=OuterRef("questionnaire_id"),
+            code=OuterRef("code"),
+        )
+        .order_by()
+        .values("questionnaire_id", "code")
+        .annotate(first_create_at=Min("create_at"))
+        .values("first_create_at")
+    )
+    Submission.objects.update(create_at=Subquery(first_answers))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("datasets", "0017_answer_statistics_value_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="submission",
+            name="create_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(populate_create_at, migrations.RunPython.noop),
+    ]
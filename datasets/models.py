@@ -1,12 +1,19 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import MD5, Coalesce
+from django.utils import timezone
 
 from authentication.models import User
 from questionnaire.models import Questionnaire
 
 
 class Answer(models.Model):
+    # Indexed as the prefix of answer_questionnaire_code_idx
     questionnaire = models.ForeignKey(
-        Questionnaire, on_delete=models.CASCADE, related_name="answers"
+        Questionnaire,
+        on_delete=models.CASCADE,
+        related_name="answers",
+        db_index=False,
     )
     answer_by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="answers"
@@ -19,11 +26,92 @@ class Answer(models.Model):
 
     class Meta:
         db_table = "answer"
-        ordering = ["questionnaire", "code"]
+        ordering = ["questionnaire_id", "code"]
         indexes = [
             models.Index(
-                fields=["questionnaire"], name="questionnaire_answer_idx"
+                fields=["questionnaire", "code"],
+                name="answer_questionnaire_code_idx",
+            ),
+            models.Index(
+                fields=["questionnaire", "question_key", "code"],
+                name="answer_question_key_idx",
+            ),
+        ]
+
+
+class AnswerStatistics(models.Model):
+    questionnaire = models.ForeignKey(
+        Questionnaire,
+        on_delete=models.CASCADE,
+        related_name="answer_statistics",
+    )
+
+    question_key = models.UUIDField(null=False)
+    value = models.TextField(blank=True, null=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "answer_statistics"
+        ordering = ["questionnaire", "id"]
+        indexes = [
+            models.Index(
+                fields=["question_key"], name="question_key_statistics_idx"
+            ),
+        ]
+        constraints = [
+            # md5 keeps long free-text values within the btree row size
+            models.UniqueConstraint(
+                F("questionnaire"),
+                F("question_key"),
+                Coalesce(MD5("value"), Value("")),
+                name="answer_statistics_value_unique",
+            ),
+        ]
+
+
+class ResponseCounter(models.Model):
+    questionnaire = models.OneToOneField(
+        Questionnaire,
+        on_delete=models.CASCADE,
+        related_name="response_counter",
+    )
+
+    last_code = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "response_counter"
+
+
+class Submission(models.Model):
+    """
+    One row per response code, mirroring its Answer rows: `values` maps
+    question key -> value and `answer_ids` question key -> answer id.
+    Written by datasets.submissions along with the answers.
+    """
+
+    # Indexed as the prefix of submission_code_unique
+    questionnaire = models.ForeignKey(
+        Questionnaire,
+        on_delete=models.CASCADE,
+        related_name="submissions",
+        db_index=False,
+    )
+    answer_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="submissions"
+    )
+
+    code = models.IntegerField()
+    values = models.JSONField(default=dict)
+    answer_ids = models.JSONField(default=dict)
+    # Time of the first answer of the response, set by build_submissions
+    create_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "submission"
+        ordering = ["questionnaire_id", "code"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["questionnaire", "code"],
+                name="submission_code_unique",
             ),
-            models.Index(fields=["question_key"], name="question_key_idx"),
-            models.Index(fields=["code"], name="code_idx"),
         ]
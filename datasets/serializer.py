@@ -1,15 +1,28 @@
+import uuid
+
 from rest_framework import serializers
 
 from authentication.serializers import AuthorSerializer
-from datasets.models import Answer
+from datasets.models import Answer, Submission
 from questionnaire.models import Question, Questionnaire
+from questionnaire.serializer import QuestionnaireField
+
+
+def get_question_sequences(questionnaire):
+    """
+    Map question key -> sequence for every question of a questionnaire,
+    to be passed to AnswerSerializer as the "sequences" context.
+    """
+    return dict(
+        Question.objects.filter(questionnaire=questionnaire)
+        .order_by()
+        .values_list("key", "sequence")
+    )
 
 
 class AnswerSerializer(serializers.ModelSerializer):
     answer_by = AuthorSerializer(read_only=True)
-    questionnaire = serializers.PrimaryKeyRelatedField(
-        queryset=Questionnaire.objects.all()
-    )
+    questionnaire = QuestionnaireField(queryset=Questionnaire.objects.all())
     id = serializers.IntegerField(read_only=True)
     create_at = serializers.DateTimeField(read_only=True)
     sequence = serializers.SerializerMethodField(read_only=True)
@@ -28,6 +41,54 @@ class AnswerSerializer(serializers.ModelSerializer):
         ]
 
     def get_sequence(self, obj):
+        sequences = self.context.get("sequences")
+        if sequences is not None:
+            return sequences.get(obj.question_key)
+
         question = Question.objects.filter(key=obj.question_key).first()
 
         return question.sequence
+
+
+class SubmissionSerializer(serializers.ModelSerializer):
+    """
+    A submission as the list of its answers in the AnswerSerializer
+    format, ordered by the "sequences" context (see get_question_sequences)
+    """
+
+    answer_by = AuthorSerializer(read_only=True)
+    create_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Submission
+        fields = [
+            "questionnaire",
+            "code",
+            "answer_by",
+            "create_at",
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        sequences = self.context.get("sequences", {})
+
+        answers = [
+            {
+                "id": instance.answer_ids.get(question_key),
+                "questionnaire": data["questionnaire"],
+                "question_key": question_key,
+                "value": value,
+                "code": data["code"],
+                "answer_by": data["answer_by"],
+                "create_at": data["create_at"],
+                "sequence": sequences.get(uuid.UUID(question_key)),
+            }
+            for question_key, value in instance.values.items()
+        ]
+        return sorted(
+            answers,
+            key=lambda answer: (
+                answer["sequence"] is None,
+                answer["sequence"] or 0,
+            ),
+        )
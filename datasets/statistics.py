@@ -0,0 +1,151 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from datasets.models import Answer, AnswerStatistics
+
+
+def answer_deltas(answers, sign=1):
+    """
+    Count answers by (questionnaire, question key, value), every answer
+    weighs `sign` so removed answers can be passed with sign=-1.
+    """
+    deltas = Counter()
+    for answer in answers:
+        deltas[
+            (answer.questionnaire_id, str(answer.question_key), answer.value)
+        ] += sign
+    return deltas
+
+
+# Upsert on answer_statistics_value_unique: values are compared through
+# their md5, NULL as "", which no md5 can be equal to
+UPSERT_STATISTICS_SQL = """
+INSERT INTO answer_statistics (questionnaire_id, question_key, value, count)
+VALUES {rows}
+ON CONFLICT (questionnaire_id, question_key, (COALESCE(MD5(value), '')))
+DO UPDATE SET count = answer_statistics.count + EXCLUDED.count
+"""
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def apply_statistics(deltas):
+    """
+    Apply answer count deltas to the AnswerStatistics counters with one
+    upsert per batch of keys, then delete the counters dropped to zero.
+
+    The unique constraint serializes concurrent first answers of a value
+    on a single row, so every delta lands on the same counter.
+    """
+    # Sorted keys lock the counters in the same order in every transaction
+    rows = sorted(
+        (
+            (questionnaire, question_key, value, delta)
+            for (questionnaire, question_key, value), delta in deltas.items()
+            if delta
+        ),
+        key=lambda row: (row[0], row[1], row[2] is not None, row[2] or ""),
+    )
+    if not rows:
+        return
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                batch = rows[start : start + UPSERT_BATCH_SIZE]
+                cursor.execute(
+                    UPSERT_STATISTICS_SQL.format(
+                        rows=", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                    ),
+                    [param for row in batch for param in row],
+                )
+
+        AnswerStatistics.objects.filter(
+            questionnaire__in={row[0] for row in rows}, count__lte=0
+        ).delete()
+
+
+def update_statistics(answers, sign=1):
+    apply_statistics(answer_deltas(answers, sign))
+
+
+def rebuild_statistics(questionnaires):
+    """
+    Recompute the counters of the given questionnaires from their answers
+    """
+    with transaction.atomic():
+        AnswerStatistics.objects.filter(
+            questionnaire__in=questionnaires
+        ).delete()
+
+        rows = (
+            Answer.objects.filter(questionnaire__in=questionnaires)
+            .order_by()
+            .values("questionnaire", "question_key", "value")
+            .annotate(count=Count("id"))
+        )
+        AnswerStatistics.objects.bulk_create(
+            [
+                AnswerStatistics(
+                    questionnaire_id=row["questionnaire"],
+                    question_key=row["question_key"],
+                    value=row["value"],
+                    count=row["count"],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+def get_statistics(questionnaire, questions):
+    """
+    Build the statistics of every question from the stored counters.
+
+    InputType questions count every distinct value, SelectType questions
+    count each option (every option of a multiselect answer is counted).
+    """
+    counts = defaultdict(Counter)
+    for question_key, value, count in AnswerStatistics.objects.filter(
+        questionnaire=questionnaire
+    ).values_list("question_key", "value", "count"):
+        counts[str(question_key)][value] += count
+
+    statistic_datasets = []
+    for question in questions:
+        question_counts = counts[str(question["key"])]
+
+        if question["type"] == "InputType":
+            statistic_datasets.append(
+                {
+                    "type": question["type"],
+                    "label": question["label"],
+                    "statistics": dict(question_counts),
+                }
+            )
+        elif question["type"] == "SelectType":
+            multiselect = question["question_detail"]["multiselect"]
+            statistics = {
+                option["value"]: 0
+                for option in question["question_detail"]["options"]
+            }
+            for value, count in question_counts.items():
+                if not value:
+                    continue
+                items = value.split(", ") if multiselect else [value]
+                for item in items:
+                    if item in statistics:
+                        statistics[item] += count
+
+            statistic_datasets.append(
+                {
+                    "type": question["type"],
+                    "label": question["label"],
+                    "multiselect": multiselect,
+                    "statistics": statistics,
+                }
+            )
+
+    return statistic_datasets
@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from datasets.models import Answer, Submission
+
+
+def build_submissions(answers):
+    """
+    Submission rows of the given answers, one per (questionnaire, code),
+    dated by their first answer. The answers must hold every answer of
+    their codes and have an id.
+    """
+    submissions = {}
+    for answer in answers:
+        if answer.code is None:
+            continue
+
+        submission = submissions.get((answer.questionnaire_id, answer.code))
+        if submission is None:
+            submission = submissions[
+                (answer.questionnaire_id, answer.code)
+            ] = Submission(
+                questionnaire_id=answer.questionnaire_id,
+                code=answer.code,
+                values={},
+                answer_ids={},
+            )
+        submission.answer_by_id = answer.answer_by_id
+        if answer.create_at and answer.create_at < submission.create_at:
+            submission.create_at = answer.create_at
+        submission.values[str(answer.question_key)] = answer.value
+        submission.answer_ids[str(answer.question_key)] = answer.id
+
+    return list(submissions.values())
+
+
+def save_submissions(answers):
+    """
+    Insert or replace, with a single upsert, the submissions of answers
+    holding every answer of their codes (new responses)
+    """
+    submissions = build_submissions(answers)
+    Submission.objects.bulk_create(
+        submissions,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["questionnaire", "code"],
+        update_fields=["answer_by", "values", "answer_ids"],
+    )
+    return submissions
+
+
+def refresh_submissions(answers):
+    """
+    Rebuild from the Answer table the submissions of the codes the given
+    answers belong to, deleting those left without answers
+    """
+    codes = defaultdict(set)
+    for answer in answers:
+        if answer.code is not None:
+            codes[answer.questionnaire_id].add(answer.code)
+
+    for questionnaire_id, questionnaire_codes in codes.items():
+        submissions = save_submissions(
+            Answer.objects.filter(
+                questionnaire_id=questionnaire_id,
+                code__in=questionnaire_codes,
+            ).order_by()
+        )
+        Submission.objects.filter(
+            questionnaire_id=questionnaire_id, code__in=questionnaire_codes
+        ).exclude(
+            code__in=[submission.code for submission in submissions]
+        ).delete()
+
+
+def rebuild_submissions(questionnaires):
+    """
+    Recompute the submissions of the given questionnaires from their
+    answers
+    """
+    with transaction.atomic():
+        Submission.objects.filter(questionnaire__in=questionnaires).delete()
+        save_submissions(
+            Answer.objects.filter(questionnaire__in=questionnaires)
+            .order_by()
+            .iterator(chunk_size=2000)
+        )
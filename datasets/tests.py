@@ -1,9 +1,23 @@
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from datasets.models import Answer
-from questionnaire.models import InputType, Question, Questionnaire
+from datasets.models import (Answer, AnswerStatistics, ResponseCounter,
+                             Submission)
+from datasets.serializer import AnswerSerializer, get_question_sequences
+from datasets.statistics import apply_statistics
+from datasets.submissions import save_submissions
+from questionnaire.models import (InputType, OptionValue, Question,
+                                  Questionnaire, SelectType)
 
 
 class AnswerViewSetTestCase(APITestCase):
@@ -72,6 +86,32 @@ class AnswerViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(Answer.objects.count(), 0)
 
+    def test_create_answer_codes(self):
+        Answer.objects.create(
+            questionnaire=self.questionnaire,
+            question_key=self.question.key,
+            value="Existing",
+            code=5,
+        )
+
+        for _ in range(2):
+            response = self.client.post(
+                "/api/v1/answer/", self.answer_data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(response.data["data"][0]["code"], 7)
+        self.assertEqual(response.data["data"][0]["sequence"], 1)
+        self.assertEqual(
+            list(Answer.objects.values_list("code", flat=True)), [5, 6, 7]
+        )
+        self.assertEqual(
+            ResponseCounter.objects.get(
+                questionnaire=self.questionnaire
+            ).last_code,
+            7,
+        )
+
     def test_update_answer(self):
         self.client.force_authenticate(user=self.user)
         answer = Answer.objects.create(
@@ -88,6 +128,103 @@ class AnswerViewSetTestCase(APITestCase):
         answer.refresh_from_db()
         self.assertEqual(answer.value, "Updated Value 1")
 
+    def test_update_answers_in_bulk(self):
+        self.client.force_authenticate(user=self.user)
+
+        def update_answers(count):
+            answers = Answer.objects.bulk_create(
+                Answer(
+                    questionnaire=self.questionnaire,
+                    question_key=self.question.key,
+                    value=f"Value {code}",
+                    code=code,
+                )
+                for code in range(1, count + 1)
+            )
+            update_data = [
+                {"id": answer.id, "value": f"Updated {answer.code}"}
+                for answer in reversed(answers)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(
+                    "/api/v1/answer/update/", update_data, format="json"
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [answer["value"] for answer in response.data["data"]],
+                [answer["value"] for answer in update_data],
+            )
+            return queries
+
+        small_update = update_answers(2)
+        Answer.objects.all().delete()
+        AnswerStatistics.objects.all().delete()
+        large_update = update_answers(10)
+        self.assertEqual(len(large_update), len(small_update))
+
+        self.assertEqual(
+            list(Answer.objects.values_list("value", flat=True)),
+            [f"Updated {code}" for code in range(1, 11)],
+        )
+
+    def test_update_answer_non_owner(self):
+        other_user = get_user_model().objects.create(
+            email="other@example.com", password="testpassword"
+        )
+        self.client.force_authenticate(user=other_user)
+        answer = Answer.objects.create(
+            questionnaire=self.questionnaire,
+            answer_by=self.user,
+            question_key=str(self.question.key),
+            value="Initial Value",
+        )
+
+        response = self.client.patch(
+            "/api/v1/answer/update/",
+            [{"id": answer.id, "value": "Updated Value"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        answer.refresh_from_db()
+        self.assertEqual(answer.value, "Initial Value")
+
+    def test_update_answer_unauthenticated(self):
+        answer = Answer.objects.create(
+            questionnaire=self.questionnaire,
+            question_key=str(self.question.key),
+            value="Initial Value",
+        )
+
+        response = self.client.patch(
+            "/api/v1/answer/update/",
+            [{"id": answer.id, "value": "Updated Value"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        answer.refresh_from_db()
+        self.assertEqual(answer.value, "Initial Value")
+
+    def test_update_answer_detail_not_allowed(self):
+        self.client.force_authenticate(user=self.user)
+        answer = Answer.objects.create(
+            questionnaire=self.questionnaire,
+            answer_by=self.user,
+            question_key=str(self.question.key),
+            value="Initial Value",
+        )
+
+        for method in (self.client.put, self.client.patch):
+            response = method(
+                f"/api/v1/answer/{answer.id}/",
+                {"value": "Updated Value"},
+                format="json",
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+        answer.refresh_from_db()
+        self.assertEqual(answer.value, "Initial Value")
+
     def test_delete_answer(self):
         self.client.force_authenticate(user=self.user)
         answer = Answer.objects.create(
@@ -127,12 +264,13 @@ class DatasetsViewSetTestCase(APITestCase):
         InputType.objects.create(
             question_key=self.question.key, placeholder="Enter your anwser"
         )
-        Answer.objects.create(
+        answer = Answer.objects.create(
             questionnaire=self.questionnaire,
             answer_by=self.user,
             question_key=str(self.question.key),
             value="To be deleted",
         )
+        save_submissions([answer])
 
     def test_list(self):
         url = "/api/v1/datasets/"
@@ -140,6 +278,39 @@ class DatasetsViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, status.HTTP_400_BAD_REQUEST)
 
+    def test_write_not_allowed(self):
+        answer = Answer.objects.get()
+        url = f"/api/v1/datasets/{answer.id}/"
+
+        response = self.client.put(url, {"value": "Updated"}, format="json")
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+        response = self.client.delete(url)
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+        answer.refresh_from_db()
+        self.assertEqual(answer.value, "To be deleted")
+        self.assertTrue(Submission.objects.filter(code=answer.code).exists())
+
+    def test_create_not_allowed(self):
+        response = self.client.post(
+            "/api/v1/datasets/",
+            {
+                "questionnaire": self.questionnaire.id,
+                "question_key": str(self.question.key),
+                "value": "Injected",
+                "code": 99,
+            },
+            format="json",
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+        self.assertFalse(Answer.objects.filter(code=99).exists())
+
     def test_retrieve(self):
         url = "/api/v1/datasets/" + self.questionnaire.slug + "/"
         response = self.client.get(url)
@@ -148,3 +319,387 @@ class DatasetsViewSetTestCase(APITestCase):
             response.data["data"]["about"]["title"], self.questionnaire.title
         )
         self.assertEqual(len(response.data["data"]["about"]["questions"]), 1)
+        self.assertEqual(
+            [
+                answer["value"]
+                for answer in response.data["data"]["datasets"][1]
+            ],
+            ["To be deleted"],
+        )
+
+    def test_download_csv(self):
+        url = (
+            "/api/v1/datasets/download/?file_type=csv&slug="
+            + self.questionnaire.slug
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            b"".join(response.streaming_content),
+            b"Test Question\r\nTo be deleted\r\n",
+        )
+
+    def test_download_xlsx(self):
+        url = "/api/v1/datasets/download/?slug=" + self.questionnaire.slug
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(
+            list(workbook.active.iter_rows(values_only=True)),
+            [("Test Question",), ("To be deleted",)],
+        )
+
+
+class AnswerSerializerTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.questionnaire = Questionnaire.objects.create(
+            title="Existing Questionnaire",
+            tags="tag1",
+            author=self.user,
+        )
+        for sequence in range(1, 4):
+            question = Question.objects.create(
+                questionnaire=self.questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for code in range(1, 4):
+                Answer.objects.create(
+                    questionnaire=self.questionnaire,
+                    answer_by=self.user,
+                    question_key=question.key,
+                    value=f"Answer {code}",
+                    code=code,
+                )
+
+    def test_sequences_context(self):
+        answers = Answer.objects.filter(
+            questionnaire=self.questionnaire
+        ).select_related("answer_by")
+        expected = [
+            answer["sequence"]
+            for answer in AnswerSerializer(answers.all(), many=True).data
+        ]
+
+        with self.assertNumQueries(2):
+            data = AnswerSerializer(
+                answers.all(),
+                many=True,
+                context={
+                    "sequences": get_question_sequences(self.questionnaire)
+                },
+            ).data
+
+        self.assertEqual([answer["sequence"] for answer in data], expected)
+
+
+class AnswerStatisticsTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.questionnaire = Questionnaire.objects.create(
+            title="Existing Questionnaire",
+            tags="tag1",
+            author=self.user,
+        )
+        self.question = Question.objects.create(
+            questionnaire=self.questionnaire,
+            type="SelectType",
+            label="Colors?",
+            sequence=1,
+        )
+        select_type = SelectType.objects.create(
+            question_key=self.question.key, multiselect=True
+        )
+        for value in ["Red", "Blue", "Green"]:
+            OptionValue.objects.create(select_type=select_type, value=value)
+
+    def submit(self, value):
+        return self.client.post(
+            "/api/v1/answer/",
+            [
+                {
+                    "questionnaire": self.questionnaire.id,
+                    "question_key": str(self.question.key),
+                    "value": value,
+                }
+            ],
+            format="json",
+        )
+
+    def get_statistics(self):
+        response = self.client.get(
+            "/api/v1/datasets/" + self.questionnaire.slug + "/"
+        )
+        return response.data["data"]["statistics"][0]["statistics"]
+
+    def test_create_update_destroy(self):
+        self.submit("Red, Blue")
+        response = self.submit("Red")
+        self.assertEqual(
+            self.get_statistics(), {"Red": 2, "Blue": 1, "Green": 0}
+        )
+
+        answer = response.data["data"][0]
+        self.client.patch(
+            "/api/v1/answer/update/",
+            [{"id": answer["id"], "value": "Green"}],
+            format="json",
+        )
+        self.assertEqual(
+            self.get_statistics(), {"Red": 1, "Blue": 1, "Green": 1}
+        )
+
+        self.client.delete(
+            f"/api/v1/answer/{answer['code']}/"
+            f"?questionnaire={self.questionnaire.id}"
+        )
+        self.assertEqual(
+            self.get_statistics(), {"Red": 1, "Blue": 1, "Green": 0}
+        )
+        self.assertEqual(AnswerStatistics.objects.count(), 1)
+
+    def test_apply_statistics_single_counter(self):
+        long_value = "word " * 5000
+        key = (self.questionnaire.id, str(self.question.key))
+        for value in [long_value, None, ""]:
+            apply_statistics({(*key, value): 1})
+            apply_statistics({(*key, value): 2})
+
+        self.assertEqual(
+            sorted(AnswerStatistics.objects.values_list("count", flat=True)),
+            [3, 3, 3],
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AnswerStatistics.objects.create(
+                questionnaire=self.questionnaire,
+                question_key=self.question.key,
+                value=long_value,
+                count=1,
+            )
+
+        apply_statistics({(*key, long_value): -3, (*key, None): -1})
+        self.assertEqual(
+            dict(AnswerStatistics.objects.values_list("value", "count")),
+            {None: 2, "": 3},
+        )
+
+    def test_rebuild_statistics(self):
+        self.submit("Red, Blue")
+        self.submit("Blue")
+        AnswerStatistics.objects.all().delete()
+
+        call_command("rebuild_statistics", stdout=StringIO())
+        self.assertEqual(
+            self.get_statistics(), {"Red": 1, "Blue": 2, "Green": 0}
+        )
+
+
+class SubmissionsTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.questionnaire = Questionnaire.objects.create(
+            title="Existing Questionnaire",
+            tags="tag1",
+            author=self.user,
+        )
+        self.questions = [
+            Question.objects.create(
+                questionnaire=self.questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for sequence in (2, 1)
+        ]
+
+    def submit(self, *values):
+        return self.client.post(
+            "/api/v1/answer/",
+            [
+                {
+                    "questionnaire": self.questionnaire.id,
+                    "question_key": str(question.key),
+                    "value": value,
+                }
+                for question, value in zip(self.questions, values)
+            ],
+            format="json",
+        )
+
+    def get_submissions(self):
+        return list(
+            Submission.objects.filter(
+                questionnaire=self.questionnaire
+            ).values_list("code", "values")
+        )
+
+    def test_create_update_destroy(self):
+        first_key, second_key = (str(q.key) for q in self.questions)
+        self.submit("A", "B")
+        response = self.submit("C", "D")
+        self.assertEqual(
+            self.get_submissions(),
+            [
+                (1, {first_key: "A", second_key: "B"}),
+                (2, {first_key: "C", second_key: "D"}),
+            ],
+        )
+
+        answer = response.data["data"][0]
+        self.client.patch(
+            "/api/v1/answer/update/",
+            [{"id": answer["id"], "value": "E"}],
+            format="json",
+        )
+        self.assertEqual(
+            self.get_submissions()[1], (2, {first_key: "E", second_key: "D"})
+        )
+
+        response = self.client.get(
+            "/api/v1/datasets/" + self.questionnaire.slug + "/"
+        )
+        self.assertEqual(
+            [
+                (answer["sequence"], answer["value"])
+                for answer in response.data["data"]["datasets"][2]
+            ],
+            [(1, "D"), (2, "E")],
+        )
+
+        self.client.delete(
+            f"/api/v1/answer/{answer['code']}/"
+            f"?questionnaire={self.questionnaire.id}"
+        )
+        self.assertEqual(
+            self.get_submissions(), [(1, {first_key: "A", second_key: "B"})]
+        )
+
+    def test_rebuild_submissions(self):
+        self.submit("A", "B")
+        self.submit("C", "D")
+        expected = self.get_submissions()
+        Submission.objects.all().delete()
+
+        call_command("rebuild_submissions", stdout=StringIO())
+        self.assertEqual(self.get_submissions(), expected)
+
+    def test_create_at_of_first_answer(self):
+        self.submit("A", "B")
+        answered_at = timezone.now() - timedelta(days=30)
+        Answer.objects.filter(questionnaire=self.questionnaire).update(
+            create_at=answered_at
+        )
+
+        call_command("rebuild_submissions", stdout=StringIO())
+        self.assertEqual(
+            Submission.objects.get(questionnaire=self.questionnaire).create_at,
+            answered_at,
+        )
+
+        response = self.client.get(
+            "/api/v1/datasets/" + self.questionnaire.slug + "/"
+        )
+        expected = AnswerSerializer(
+            Answer.objects.filter(questionnaire=self.questionnaire),
+            many=True,
+        ).data
+        self.assertEqual(
+            [
+                answer["create_at"]
+                for answer in response.data["data"]["datasets"][1]
+            ],
+            [answer["create_at"] for answer in expected],
+        )
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    The dataset queries must be answered from the composite indexes, in
+    index order, rather than with a sort of the questionnaire's rows
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        questionnaires = [
+            Questionnaire.objects.create(
+                title=f"Questionnaire {i}", slug=f"questionnaire-{i}"
+            )
+            for i in range(3)
+        ]
+        self.questionnaire = questionnaires[0]
+        self.question_key = uuid.uuid4()
+
+        for questionnaire in questionnaires:
+            question_keys = [self.question_key] + [
+                uuid.uuid4() for _ in range(4)
+            ]
+            answers = Answer.objects.bulk_create(
+                Answer(
+                    questionnaire=questionnaire,
+                    question_key=question_key,
+                    value=str(code % 7),
+                    code=code,
+                )
+                for code in range(200, 0, -1)
+                for question_key in question_keys
+            )
+            save_submissions(answers)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE answer")
+            cursor.execute("ANALYZE submission")
+            # The seeded tables are small: leave plain index scans as the
+            # only option, a Sort then means no index matches the order
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_retrieve_submissions(self):
+        self.assertUsesIndex(
+            Submission.objects.filter(questionnaire=self.questionnaire),
+            "submission_code_unique",
+        )
+
+    def test_response_answers(self):
+        self.assertUsesIndex(
+            Answer.objects.filter(questionnaire=self.questionnaire, code=5),
+            "answer_questionnaire_code_idx",
+        )
+
+    def test_last_code(self):
+        self.assertUsesIndex(
+            Answer.objects.filter(questionnaire=self.questionnaire)
+            .order_by("-code")
+            .values("code")[:1],
+            "answer_questionnaire_code_idx",
+        )
+
+    def test_question_answers(self):
+        self.assertUsesIndex(
+            Answer.objects.filter(
+                questionnaire=self.questionnaire,
+                question_key=self.question_key,
+            ),
+            "answer_question_key_idx",
+        )
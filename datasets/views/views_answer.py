@@ -1,12 +1,20 @@
+from django.db import transaction
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import MethodNotAllowed
 from rest_framework.response import Response
 
-from api.exceptions import AnswerNotEnoughException
+from api.exceptions import (AnswerNotEnoughException,
+                            AnswerNotFoundException,
+                            PermissionDeniedException)
 from api.utils import ObjectResponse, StatusResponse, try_except_wrapper
-from datasets.models import Answer
-from datasets.serializer import AnswerSerializer
-from questionnaire.models import Question
+from datasets.codes import allocate_codes
+from datasets.models import Answer, Submission
+from datasets.serializer import AnswerSerializer, get_question_sequences
+from datasets.statistics import (answer_deltas, apply_statistics,
+                                 update_statistics)
+from datasets.submissions import refresh_submissions, save_submissions
+from questionnaire.models import Question, Questionnaire
 
 
 class AnswerViewSet(viewsets.ModelViewSet):
@@ -15,25 +23,41 @@ class AnswerViewSet(viewsets.ModelViewSet):
     lookup_field = "pk"
 
     def create(self, request, *args, **kwargs):
-        dataset = []
-
         questions_size = Question.objects.filter(
             questionnaire=request.data[0]["questionnaire"]
         ).count()
         if len(request.data) != questions_size:
             raise AnswerNotEnoughException
 
-        max_code = (
-            Answer.objects.filter(
-                questionnaire=request.data[0]["questionnaire"]
-            )
-            .order_by("-code")
-            .first()
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            context={
+                "questionnaires": Questionnaire.objects.in_bulk(
+                    [request.data[0]["questionnaire"]]
+                )
+            },
         )
+        serializer.is_valid(raise_exception=True)
 
-        for answer in request.data:
-            answer["code"] = max_code.code + 1 if max_code is not None else 1
-            dataset.append(self.handle_create(request, answer))
+        answer_by = request.user if request.user.is_authenticated else None
+        questionnaire = serializer.validated_data[0]["questionnaire"]
+
+        with transaction.atomic():
+            code = allocate_codes(questionnaire.pk)
+            answers = [
+                Answer(**{**data, "code": code}, answer_by=answer_by)
+                for data in serializer.validated_data
+            ]
+            Answer.objects.bulk_create(answers)
+            update_statistics(answers)
+            save_submissions(answers)
+
+        dataset = AnswerSerializer(
+            answers,
+            many=True,
+            context={"sequences": get_question_sequences(questionnaire)},
+        ).data
 
         return Response(
             ObjectResponse(
@@ -44,17 +68,6 @@ class AnswerViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED,
         )
 
-    def handle_create(self, request, data, *args, **kwargs):
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-
-        if request.user.is_authenticated:
-            serializer.save(answer_by=request.user)
-        else:
-            serializer.save()
-
-        return serializer.data
-
     @action(
         methods=["PATCH"],
         url_path="update",
@@ -63,15 +76,57 @@ class AnswerViewSet(viewsets.ModelViewSet):
     )
     @try_except_wrapper
     def handle_update(self, request, *args, **kwargs):
-        dataset = []
-
-        for answer in request.data:
-            instance = Answer.objects.get(pk=answer["id"])
-            instance.value = answer["value"]
-            instance.save()
-            serializer = AnswerSerializer(instance)
-
-            dataset.append(serializer.data)
+        """
+        Update the value of a list of answers given by the current user or
+        belonging to one of their questionnaires
+        """
+        if not request.user.is_authenticated:
+            raise PermissionDeniedException
+
+        value_field = AnswerSerializer().fields["value"]
+        values = {
+            int(answer["id"]): value_field.run_validation(answer["value"])
+            for answer in request.data
+        }
+
+        with transaction.atomic():
+            # Locked, so the statistics are decremented from the values
+            # being replaced even when the answers are updated concurrently
+            answers = (
+                Answer.objects.select_related("questionnaire", "answer_by")
+                .select_for_update(of=("self",))
+                .order_by("id")
+                .in_bulk(values)
+            )
+            if len(answers) != len(values):
+                raise AnswerNotFoundException
+
+            for answer in answers.values():
+                # Anonymous answers have no answer_by: only the author
+                # owns them
+                owners = {answer.answer_by_id, answer.questionnaire.author_id}
+                if request.user.pk not in owners - {None}:
+                    raise PermissionDeniedException
+
+            deltas = answer_deltas(answers.values(), sign=-1)
+            for answer_id, value in values.items():
+                answers[answer_id].value = value
+            deltas.update(answer_deltas(answers.values()))
+
+            Answer.objects.bulk_update(answers.values(), ["value"])
+            apply_statistics(deltas)
+            refresh_submissions(answers.values())
+
+        sequences = {}
+        for questionnaire in {
+            answer.questionnaire_id for answer in answers.values()
+        }:
+            sequences.update(get_question_sequences(questionnaire))
+        dataset = AnswerSerializer(
+            [answers[answer_id] for answer_id in values],
+            many=True,
+            context={"sequences": sequences},
+        ).data
 
         return Response(
             ObjectResponse(
@@ -82,10 +137,34 @@ class AnswerViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
+    def update(self, request, *args, **kwargs):
+        """
+        Answers are only updated through handle_update, which keeps the
+        statistics and submissions in sync with them
+        """
+        raise MethodNotAllowed(request.method)
+
+    def partial_update(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
     def destroy(self, request, *args, **kwargs):
         code = self.kwargs.get("pk")
         questionnaire = request.query_params.get("questionnaire")
-        Answer.objects.filter(questionnaire=questionnaire, code=code).delete()
+        with transaction.atomic():
+            # Locked, so a concurrent update or delete of the same answers
+            # waits and the statistics are decremented from what is deleted
+            answers = list(
+                Answer.objects.select_for_update()
+                .filter(questionnaire=questionnaire, code=code)
+                .order_by("id")
+            )
+            update_statistics(answers, sign=-1)
+            Answer.objects.filter(
+                id__in=[answer.id for answer in answers]
+            ).delete()
+            Submission.objects.filter(
+                questionnaire=questionnaire, code=code
+            ).delete()
 
         return Response(
             ObjectResponse(
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class QuestionnaireConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "questionnaire"
+
+    def ready(self):
+        # Register the question types (InputType, SelectType, ...)
+        from questionnaire import serializer  # noqa: F401
@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+from django.db import transaction
+from rest_framework import serializers
+
+from api.exceptions import PermissionDeniedException
+from questionnaire.models import Question, Questionnaire
+from questionnaire.registry import get_question_type
+from questionnaire.serializer import QuestionSerializer
+
+
+def validate_questions(data):
+    """
+    Validate a batch of questions and of their question_detail.
+
+    Return (question serializer, detail serializer or None) pairs, or
+    raise one ValidationError listing the errors of every item.
+    """
+    questionnaire_ids = set()
+    for item in data:
+        try:
+            questionnaire_ids.add(int(item.get("questionnaire")))
+        except (TypeError, ValueError):
+            pass
+    context = {
+        "questionnaires": Questionnaire.objects.in_bulk(questionnaire_ids)
+    }
+
+    validated = []
+    errors = []
+    for item in data:
+        serializer = QuestionSerializer(data=item, context=context)
+        item_errors = {} if serializer.is_valid() else dict(serializer.errors)
+
+        question_detail = None
+        question_type = get_question_type(item.get("type"))
+        if question_type is not None:
+            detail_data = item.get("question_detail") or {}
+            question_detail = question_type.serializer_class(
+                data=detail_data,
+                context={"options": detail_data.get("options", "")},
+            )
+            if not question_detail.is_valid():
+                item_errors["question_detail"] = question_detail.errors
+
+        validated.append((serializer, question_detail))
+        errors.append(item_errors)
+
+    if any(errors):
+        raise serializers.ValidationError(errors)
+
+    return validated
+
+
+def set_prefetched(instance, prefetch, objs):
+    """
+    Fill the prefetch cache of the `prefetch` reverse relations of an
+    instance with the given related objects, as prefetch_related would
+    """
+    cache = instance.__dict__.setdefault("_prefetched_objects_cache", {})
+    for name in prefetch:
+        field = instance._meta.get_field(name)
+        queryset = getattr(instance, name).all()
+        queryset._result_cache = [
+            obj for obj in objs if isinstance(obj, field.related_model)
+        ]
+        queryset._prefetch_done = True
+        cache[field.get_cache_name()] = queryset
+
+
+def bulk_create_questions(data, create_by):
+    """
+    Create a batch of questions with their details in one transaction:
+    one INSERT per model, whatever the number of questions.
+
+    Return the serialized questions, built from the inserted rows.
+    """
+    validated = validate_questions(data)
+
+    for serializer, _ in validated:
+        if serializer.validated_data["questionnaire"].author != create_by:
+            raise PermissionDeniedException
+
+    questions = [
+        Question(create_by=create_by, **serializer.validated_data)
+        for serializer, _ in validated
+    ]
+
+    details_by_type = defaultdict(list)
+    question_details = {}
+    with transaction.atomic():
+        Question.objects.bulk_create(questions)
+
+        for question, (_, question_detail) in zip(questions, validated):
+            if question_detail is None:
+                continue
+            instance = question_detail.Meta.model(
+                question_key=question.key, **question_detail.validated_data
+            )
+            details_by_type[question.type].append((question_detail, instance))
+            question_details[question.key] = instance
+
+        for name, details in details_by_type.items():
+            question_type = get_question_type(name)
+            instances = [instance for _, instance in details]
+            question_type.model.objects.bulk_create(instances)
+
+            related = defaultdict(list)
+            related_by_instance = []
+            for question_detail, instance in details:
+                build_related = getattr(question_detail, "build_related", None)
+                objs = list(build_related(instance)) if build_related else []
+                for obj in objs:
+                    related[type(obj)].append(obj)
+                related_by_instance.append((instance, objs))
+            for model, objs in related.items():
+                model.objects.bulk_create(objs)
+
+            # The inserted rows are the prefetched relations, not re-read
+            for instance, objs in related_by_instance:
+                set_prefetched(instance, question_type.prefetch, objs)
+
+    return QuestionSerializer(
+        questions,
+        many=True,
+        context={"question_details": question_details},
+    ).data
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags
+
+ALL_TAGS_CACHE_KEY = "all_tags"
+ALL_TAGS_VERSION_CACHE_KEY = "all_tags_version"
+
+# In-process copy of the shared cache entry, checked against its version
+_local_entries = {}
+
+
+def drop_all_tags_version():
+    cache.delete(ALL_TAGS_VERSION_CACHE_KEY)
+    _local_entries.clear()
+
+
+def invalidate_all_tags():
+    """
+    Drop the cached all-tags payload once the current transaction commits:
+    dropped earlier, a concurrent request could rebuild it from the data
+    before the commit and cache it under the new version.
+    """
+    transaction.on_commit(drop_all_tags_version)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of an ETag with an If-None-Match header value, a
+    comma separated list of ETags or "*"
+    """
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in (tag.removeprefix("W/") for tag in etags)
+
+
+def get_all_tags_entry(build):
+    """
+    Cached all-tags payload with its ETag and Last-Modified header values.
+
+    Entries live in the process and in the shared cache backend and are
+    keyed by a version which invalidate_all_tags() drops. `build` is
+    called to compute the payload on a miss.
+    """
+    version = cache.get(ALL_TAGS_VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(ALL_TAGS_VERSION_CACHE_KEY, version, timeout=None):
+            version = cache.get(ALL_TAGS_VERSION_CACHE_KEY, version)
+
+    entry = _local_entries.get(ALL_TAGS_CACHE_KEY)
+    if entry is not None and entry["version"] == version:
+        return entry
+
+    entry = cache.get(ALL_TAGS_CACHE_KEY)
+    if entry is None or entry["version"] != version:
+        data = build()
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        entry = {
+            "version": version,
+            "data": data,
+            "etag": f'"{hashlib.md5(content.encode()).hexdigest()}"',
+            "last_modified": http_date(timezone.now().timestamp()),
+        }
+        cache.set(ALL_TAGS_CACHE_KEY, entry, timeout=None)
+
+    _local_entries[ALL_TAGS_CACHE_KEY] = entry
+    return entry
@@ -0,0 +1,39 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from questionnaire.models import Questionnaire, Statistics
+
+
+def increment_views(questionnaire):
+    """
+    Count a view of the questionnaire and of its statistics of the day
+    with UPDATE ... SET views = views + 1, without Questionnaire.save().
+    """
+    Questionnaire.objects.filter(pk=questionnaire.pk).update(
+        views=F("views") + 1
+    )
+    questionnaire.views += 1
+
+    current_date = str(timezone.now().date())
+    today_stats = Statistics.objects.filter(
+        questionnaire=questionnaire, create_at=current_date
+    )
+    if today_stats.update(views=F("views") + 1):
+        return
+
+    try:
+        with transaction.atomic():
+            Statistics.objects.create(
+                questionnaire=questionnaire, create_at=current_date, views=1
+            )
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        today_stats.update(views=F("views") + 1)
+
+
+def increment_downloads(questionnaire):
+    Questionnaire.objects.filter(pk=questionnaire.pk).update(
+        downloads=F("downloads") + 1
+    )
+    questionnaire.downloads += 1
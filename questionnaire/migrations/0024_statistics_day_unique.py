@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicated_statistics(apps, schema_editor):
+    Statistics = apps.get_model("questionnaire", "Statistics")
+
+    duplicates = (
+        Statistics.objects.order_by()
+        .values("questionnaire", "create_at")
+        .annotate(total=Sum("views"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        stats = Statistics.objects.filter(
+            questionnaire=duplicate["questionnaire"],
+            create_at=duplicate["create_at"],
+        ).order_by("id")
+        first = stats.first()
+        stats.exclude(pk=first.pk).delete()
+        stats.filter(pk=first.pk).update(views=duplicate["total"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0023_alter_questionnaire_thumb"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicated_statistics, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="statistics",
+            constraint=models.UniqueConstraint(
+                fields=("questionnaire", "create_at"),
+                name="statistics_day_unique",
+            ),
+        ),
+    ]
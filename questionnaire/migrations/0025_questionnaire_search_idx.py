@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# pg_trgm is a contrib extension which is not installed on every server
+# and that the migration role may not be allowed to create: the fuzzy
+# title search is enabled only where it can be created
+CREATE_TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+    ) THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS questionnaire_title_trgm_idx
+            ON questionnaire USING gin (title gin_trgm_ops);
+    END IF;
+EXCEPTION
+    WHEN insufficient_privilege THEN
+        RAISE NOTICE 'pg_trgm not created, fuzzy title search disabled: %',
+            SQLERRM;
+END
+$$;
+"""
+
+DROP_TRIGRAM_INDEX = "DROP INDEX IF EXISTS questionnaire_title_trgm_idx;"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0024_statistics_day_unique"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="questionnaire",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "title", "summary", "description", config="simple"
+                ),
+                name="questionnaire_search_idx",
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGRAM_INDEX, DROP_TRIGRAM_INDEX),
+    ]
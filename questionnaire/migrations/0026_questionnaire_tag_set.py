@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+def link_tags(apps, schema_editor):
+    Questionnaire = apps.get_model("questionnaire", "Questionnaire")
+    Tags = apps.get_model("questionnaire", "Tags")
+
+    for questionnaire in Questionnaire.objects.iterator():
+        names = [name.strip() for name in questionnaire.tags.split("|")]
+        tags = [
+            Tags.objects.get_or_create(name=name)[0]
+            for name in dict.fromkeys(names)
+            if name
+        ]
+        questionnaire.tag_set.set(tags)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("questionnaire", "0025_questionnaire_search_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="questionnaire",
+            name="tag_set",
+            field=models.ManyToManyField(
+                blank=True,
+                db_table="questionnaire_tags",
+                related_name="questionnaires",
+                to="questionnaire.tags",
+            ),
+        ),
+        migrations.RunPython(link_tags, migrations.RunPython.noop),
+    ]
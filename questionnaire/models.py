@@ -1,11 +1,23 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.text import slugify
 
 from authentication.models import User
+from questionnaire.cache import invalidate_all_tags
+
+
+def parse_tags(tags):
+    """
+    Split a "|" separated tags string into unique, non-empty tag names
+    """
+    names = [name.strip() for name in (tags or "").split("|")]
+    return list(dict.fromkeys(name for name in names if name))
 
 
 class Questionnaire(models.Model):
@@ -37,6 +49,12 @@ class Questionnaire(models.Model):
         related_name="likes",
         blank=True,
     )
+    tag_set = models.ManyToManyField(
+        "Tags",
+        related_name="questionnaires",
+        blank=True,
+        db_table="questionnaire_tags",
+    )
 
     class Meta:
         db_table = "questionnaire"
@@ -44,20 +62,44 @@ class Questionnaire(models.Model):
         indexes = [
             models.Index(fields=["slug"], name="slug_idx"),
             models.Index(fields=["tags"], name="tags_idx"),
+            GinIndex(
+                SearchVector(
+                    "title", "summary", "description", config="simple"
+                ),
+                name="questionnaire_search_idx",
+            ),
         ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored tags to sync tag_set only when they change
+        instance._loaded_tags = instance.__dict__.get("tags")
+        return instance
+
     def save(self, *args, **kwargs):
         self.slug = slugify(self.title)
 
-        tags = self.tags.split("|")
-        for tag_name in tags:
-            Tags.objects.get_or_create(name=tag_name.strip())
+        update_fields = kwargs.get("update_fields")
+        sync_tags = (
+            update_fields is None or "tags" in update_fields
+        ) and self.tags != getattr(self, "_loaded_tags", None)
 
         super(Questionnaire, self).save(*args, **kwargs)
 
+        if sync_tags:
+            self.tag_set.set(Tags.objects.upsert(parse_tags(self.tags)))
+            self._loaded_tags = self.tags
+            invalidate_all_tags()
+
+    def delete(self, *args, **kwargs):
+        result = super(Questionnaire, self).delete(*args, **kwargs)
+        invalidate_all_tags()
+        return result
+
 
 class Question(models.Model):
     questionnaire = models.ForeignKey(
@@ -148,7 +190,41 @@ class OptionValue(models.Model):
         ]
 
 
+class TagsManager(models.Manager):
+    VOCABULARY_CACHE_KEY = "tags_vocabulary"
+
+    def vocabulary(self):
+        """
+        Names of all tags, cached until a new tag is created
+        """
+        names = cache.get(self.VOCABULARY_CACHE_KEY)
+        if names is None:
+            names = set(self.values_list("name", flat=True))
+            cache.set(self.VOCABULARY_CACHE_KEY, names, timeout=None)
+        return names
+
+    def upsert(self, names):
+        """
+        Return the tags with the given names, the missing ones are created
+        with a single INSERT ... ON CONFLICT DO NOTHING
+        """
+        tags = list(self.filter(name__in=names))
+        if len(tags) == len(names):
+            return tags
+
+        self.bulk_create(
+            [self.model(name=name) for name in names], ignore_conflicts=True
+        )
+        # After the commit, or a concurrent vocabulary() call could cache
+        # the names read before it until the next tag is created
+        transaction.on_commit(lambda: cache.delete(self.VOCABULARY_CACHE_KEY))
+        invalidate_all_tags()
+        return list(self.filter(name__in=names))
+
+
 class Tags(models.Model):
+    objects = TagsManager()
+
     name = models.CharField(max_length=300, unique=True)
     create_at = models.DateTimeField(auto_now_add=True)
 
@@ -169,6 +245,12 @@ class Statistics(models.Model):
         indexes = [
             models.Index(fields=["create_at"], name="create_at_idx"),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["questionnaire", "create_at"],
+                name="statistics_day_unique",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         current_datetime = timezone.now()
@@ -0,0 +1,53 @@
+from typing import NamedTuple, Optional, Tuple
+
+
+class QuestionType(NamedTuple):
+    """
+    How the detail of a question type is stored and serialized: `model`
+    rows are keyed by question_key, `prefetch` lists the relations to
+    prefetch when loading them in bulk.
+    """
+
+    name: str
+    model: type
+    serializer_class: type
+    prefetch: Tuple[str, ...] = ()
+
+
+_question_types = {}
+
+
+def register_question_type(name, model, serializer_class, prefetch=()):
+    _question_types[name] = QuestionType(
+        name, model, serializer_class, tuple(prefetch)
+    )
+
+
+def get_question_type(name) -> Optional[QuestionType]:
+    return _question_types.get(name)
+
+
+def get_question_details(questions):
+    """
+    Map question key -> question detail of the given questions, loading
+    each question type with a single query.
+    """
+    keys_by_type = {}
+    for question in questions:
+        keys_by_type.setdefault(question.type, []).append(question.key)
+
+    question_details = {}
+    for name, keys in keys_by_type.items():
+        question_type = get_question_type(name)
+        if question_type is None:
+            continue
+
+        related_data = question_type.model.objects.filter(
+            question_key__in=keys
+        ).prefetch_related(*question_type.prefetch)
+        for question_detail in related_data:
+            question_details.setdefault(
+                question_detail.question_key, question_detail
+            )
+
+    return question_details
@@ -0,0 +1,64 @@
+import re
+from functools import lru_cache
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                           SearchVector, TrigramWordSimilarity)
+from django.db import connection
+from django.db.models import F, Q
+
+# Must stay identical to the expression of questionnaire_search_idx
+# "simple" config: titles are in several languages, so no stemming
+SEARCH_VECTOR = SearchVector(
+    "title", "summary", "description", config="simple"
+)
+
+
+@lru_cache(maxsize=None)
+def has_trigram_extension():
+    """
+    Check once per process that pg_trgm is installed (it is created by the
+    questionnaire migrations only where the server provides it)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def build_search_query(key):
+    """
+    Prefix query matching every word of the key: "stud surv" matches
+    "Student survey"
+    """
+    words = re.findall(r"\w+", key)
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        config="simple",
+        search_type="raw",
+    )
+
+
+def search_questionnaires(questionnaires, key):
+    """
+    Full-text search over title, summary and description, plus fuzzy
+    title matching with pg_trgm when available, ordered by relevance.
+    """
+    query = build_search_query(key)
+    if query is None:
+        return questionnaires.filter(title__icontains=key)
+
+    questionnaires = questionnaires.annotate(
+        search=SEARCH_VECTOR, rank=SearchRank(SEARCH_VECTOR, query)
+    )
+
+    if has_trigram_extension():
+        return (
+            questionnaires.annotate(
+                similarity=TrigramWordSimilarity(key, "title")
+            )
+            .filter(Q(search=query) | Q(title__trigram_word_similar=key))
+            .order_by((F("rank") + F("similarity")).desc(), "-create_at")
+        )
+
+    return questionnaires.filter(search=query).order_by("-rank", "-create_at")
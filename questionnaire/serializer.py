@@ -1,12 +1,52 @@
-from django.apps import apps
 from rest_framework import serializers
 
 from authentication.serializers import AuthorSerializer
 from questionnaire.models import (InputType, OptionValue, Question,
                                   Questionnaire, SelectType, Statistics, Tags)
-
-
-class QuestionSummarySerializer(serializers.ModelSerializer):
+from questionnaire.registry import (get_question_details, get_question_type,
+                                    register_question_type)
+
+
+def get_questionnaire_context(questionnaires):
+    """
+    Serializer context with the details of every question of the given
+    questionnaires (their questions should be prefetched), so that
+    QuestionnaireSerializer does not query them one by one.
+    """
+    questions = [
+        question
+        for questionnaire in questionnaires
+        for question in questionnaire.questions.all()
+    ]
+    return {"question_details": get_question_details(questions)}
+
+
+class QuestionDetailMixin:
+    def load_question_detail(self, obj):
+        """
+        Detail instance of a question, taken from the "question_details"
+        context when the serializer is given one.
+        """
+        question_details = self.context.get("question_details")
+        if question_details is not None:
+            return question_details.get(obj.key)
+
+        question_type = get_question_type(obj.type)
+        if question_type is not None:
+            return question_type.model.objects.filter(
+                question_key=obj.key
+            ).first()
+
+    def serialize_question_detail(self, obj):
+        question_detail = self.load_question_detail(obj)
+        if question_detail is not None:
+            question_type = get_question_type(obj.type)
+            return question_type.serializer_class(question_detail).data
+
+
+class QuestionSummarySerializer(
+    QuestionDetailMixin, serializers.ModelSerializer
+):
     id = serializers.IntegerField(read_only=True)
     key = serializers.CharField(read_only=True)
     create_at = serializers.DateTimeField(read_only=True)
@@ -29,13 +69,7 @@ class QuestionSummarySerializer(serializers.ModelSerializer):
         ]
 
     def get_question_detail(self, obj):
-        Model = apps.get_model(app_label="questionnaire", model_name=obj.type)
-
-        if Model is not None:
-            related_data = Model.objects.filter(question_key=obj.key)
-            serializer_class = globals()[f"{Model.__name__}Serializer"]
-            serializer = serializer_class(related_data, many=True)
-            return serializer.data[0] if serializer.data else {}
+        return self.serialize_question_detail(obj) or {}
 
 
 class StatisticViewsSerializer(serializers.ModelSerializer):
@@ -82,6 +116,33 @@ class QuestionnaireSerializer(serializers.ModelSerializer):
     #     return data
 
 
+class QuestionnaireSummarySerializer(serializers.ModelSerializer):
+    author = AuthorSerializer(read_only=True)
+    num_questions = serializers.IntegerField(read_only=True)
+    num_likers = serializers.IntegerField(read_only=True)
+    num_answers = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Questionnaire
+        fields = [
+            "id",
+            "title",
+            "slug",
+            "thumb",
+            "summary",
+            "tags",
+            "is_collecting",
+            "is_public",
+            "views",
+            "downloads",
+            "author",
+            "create_at",
+            "num_questions",
+            "num_likers",
+            "num_answers",
+        ]
+
+
 class QuestionnaireThumbSerializer(serializers.ModelSerializer):
     class Meta:
         model = Questionnaire
@@ -102,12 +163,26 @@ class QuestionnaireThumbSerializer(serializers.ModelSerializer):
         fields = ["thumb"]
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionnaireField(serializers.PrimaryKeyRelatedField):
+    """
+    Taken from the "questionnaires" context (id -> questionnaire) when the
+    serializer is given one, so a batch of questions loads them once.
+    """
+
+    def to_internal_value(self, data):
+        questionnaires = self.context.get("questionnaires")
+        if questionnaires is not None:
+            try:
+                return questionnaires[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class QuestionSerializer(QuestionDetailMixin, serializers.ModelSerializer):
     update_by = AuthorSerializer(read_only=True)
     create_by = AuthorSerializer(read_only=True)
-    questionnaire = serializers.PrimaryKeyRelatedField(
-        queryset=Questionnaire.objects.all()
-    )
+    questionnaire = QuestionnaireField(queryset=Questionnaire.objects.all())
     id = serializers.IntegerField(read_only=True)
     key = serializers.CharField(read_only=True)
     create_at = serializers.DateTimeField(read_only=True)
@@ -131,14 +206,14 @@ class QuestionSerializer(serializers.ModelSerializer):
         ]
 
     def get_question_detail(self, obj):
-        Model = apps.get_model(app_label="questionnaire", model_name=obj.type)
+        return self.serialize_question_detail(obj)
 
-        if Model is not None:
-            related_data = Model.objects.filter(question_key=obj.key)
-            serializer_class = globals()[f"{Model.__name__}Serializer"]
-            if related_data.count() > 0:
-                serializer = serializer_class(related_data.first())
-                return serializer.data
+    def validate_type(self, value):
+        if get_question_type(value) is None:
+            raise serializers.ValidationError(
+                f"Unknown question type: {value}."
+            )
+        return value
 
 
 class OptionValueSerializer(serializers.ModelSerializer):
@@ -189,47 +264,72 @@ class SelectTypeSerializer(serializers.ModelSerializer):
             "options",
         ]
 
+    def build_related(self, instance):
+        """
+        Unsaved options of a new select type, from the "options" context
+        """
+        return [
+            OptionValue(select_type=instance, value=option["value"])
+            for option in self.context.get("options") or []
+        ]
+
     def create(self, validated_data):
         instance = super().create(validated_data)
-        options = self.context.get("options")
-
-        for option in options:
-            option["select_type"] = instance
-            OptionValue.objects.create(**option)
+        OptionValue.objects.bulk_create(self.build_related(instance))
 
         return instance
 
     def update(self, instance, validated_data):
+        """
+        Sync the options with the "options" context as a diff: options
+        with a known id are updated, those missing are deleted, the others
+        are created.
+        """
         instance = super().update(instance, validated_data)
-        options = self.context.get("options")
-
-        oldOptions = OptionValue.objects.filter(select_type=instance)
-        option_ids = [option["id"] for option in options if "id" in option]
-
-        # Remove
-        for option in oldOptions:
-            if option.id not in option_ids:
-                OptionValue.objects.filter(pk=option.id).delete()
+        options = self.context.get("options") or []
 
-        # Update or Create
+        old_options = {option.id: option for option in instance.options.all()}
+        to_update = []
+        to_create = []
+        kept_ids = set()
         for option in options:
-            if "id" in option:
-                OptionValue.objects.update_or_create(
-                    select_type=instance, pk=option["id"], defaults=option
+            old_option = old_options.get(option.get("id"))
+            if old_option is None:
+                to_create.append(
+                    OptionValue(select_type=instance, value=option["value"])
                 )
-            else:
-                option["select_type"] = instance
-                OptionValue.objects.create(**option)
+                continue
+
+            kept_ids.add(old_option.id)
+            if old_option.value != option["value"]:
+                old_option.value = option["value"]
+                to_update.append(old_option)
+
+        removed_ids = old_options.keys() - kept_ids
+        if removed_ids:
+            OptionValue.objects.filter(id__in=removed_ids).delete()
+        if to_update:
+            OptionValue.objects.bulk_update(to_update, ["value"])
+        if to_create:
+            OptionValue.objects.bulk_create(to_create)
 
         return instance
 
 
 class TagsSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
+    num_questionnaires = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Tags
         fields = [
             "id",
             "name",
+            "num_questionnaires",
         ]
+
+
+register_question_type("InputType", InputType, InputTypeSerializer)
+register_question_type(
+    "SelectType", SelectType, SelectTypeSerializer, prefetch=["options"]
+)
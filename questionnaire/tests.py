@@ -1,9 +1,20 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import InputType, OptionValue, Question, Questionnaire, SelectType
+from datasets.models import Answer
+
+from .counters import increment_downloads, increment_views
+from .models import (InputType, OptionValue, Question, Questionnaire,
+                     SelectType, Statistics, Tags)
+from .views.views_question import QuestionViewSet
 
 
 class QuestionnaireViewSetTestCase(TestCase):
@@ -76,6 +87,174 @@ class QuestionnaireViewSetTestCase(TestCase):
         response = self.client.get(self.create_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_questionnaires_query_count(self):
+        def create_questionnaire(title):
+            questionnaire = Questionnaire.objects.create(
+                title=title, tags="tag1", author=self.user
+            )
+            questionnaire.likers.add(self.user)
+            for sequence in range(1, 3):
+                question = Question.objects.create(
+                    questionnaire=questionnaire,
+                    type="SelectType",
+                    label=f"Question {sequence}",
+                    sequence=sequence,
+                )
+                select_type = SelectType.objects.create(
+                    question_key=question.key
+                )
+                OptionValue.objects.create(
+                    select_type=select_type, value="Option 1"
+                )
+
+        create_questionnaire("Questionnaire 1")
+        with CaptureQueriesContext(connection) as one_questionnaire:
+            self.client.get(self.create_url + "?limit=10")
+
+        create_questionnaire("Questionnaire 2")
+        create_questionnaire("Questionnaire 3")
+        with CaptureQueriesContext(connection) as three_questionnaires:
+            response = self.client.get(self.create_url + "?limit=10")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(
+            response.data["results"][0]["questions"][0]["question_detail"][
+                "options"
+            ][0]["value"],
+            "Option 1",
+        )
+        self.assertEqual(
+            len(three_questionnaires.captured_queries),
+            len(one_questionnaire.captured_queries),
+        )
+
+    def test_search_questionnaires(self):
+        Questionnaire.objects.create(
+            title="Student survey",
+            summary="Habits of university students",
+            tags="tag1",
+            author=self.user,
+        )
+        Questionnaire.objects.create(
+            title="Coffee habits", tags="tag1", author=self.user
+        )
+
+        response = self.client.get(self.create_url + "?key=stud surv")
+        self.assertEqual(
+            [result["title"] for result in response.data["results"]],
+            ["Student survey"],
+        )
+
+        response = self.client.get(self.create_url + "?key=habits&limit=10")
+        self.assertEqual(
+            {result["title"] for result in response.data["results"]},
+            {"Student survey", "Coffee habits"},
+        )
+
+    def test_filter_tags(self):
+        Questionnaire.objects.create(
+            title="Party planning", tags="party|food", author=self.user
+        )
+        Questionnaire.objects.create(
+            title="Art lovers", tags="art|food", author=self.user
+        )
+
+        response = self.client.get(self.create_url + "?tags=art|tag1")
+        self.assertEqual(
+            {result["title"] for result in response.data["results"]},
+            {"Art lovers", "Existing Questionnaire"},
+        )
+
+        response = self.client.get(
+            self.create_url + "?tags=art|food&tags_match=all"
+        )
+        self.assertEqual(
+            [result["title"] for result in response.data["results"]],
+            ["Art lovers"],
+        )
+
+    def test_get_all_tags(self):
+        cache.clear()
+        Questionnaire.objects.create(
+            title="Art lovers", tags="tag1|art", author=self.user
+        )
+
+        response = self.client.get(self.create_url + "all-tags/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        num_questionnaires = {
+            tag["name"]: tag["num_questionnaires"]
+            for tag in response.data["data"]
+        }
+        self.assertEqual(num_questionnaires["tag1"], 2)
+        self.assertEqual(num_questionnaires["art"], 1)
+
+    def test_get_all_tags_conditional(self):
+        cache.clear()
+        url = self.create_url + "all-tags/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        for if_none_match in (f'"other", W/{etag}', "*"):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Invalidated when the transaction commits, not before
+        with self.captureOnCommitCallbacks(execute=True):
+            Questionnaire.objects.create(
+                title="Art lovers", tags="art", author=self.user
+            )
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_questionnaires_summary(self):
+        question = Question.objects.create(
+            questionnaire=self.questionnaire,
+            type="InputType",
+            label="Question 1",
+            sequence=1,
+        )
+        self.questionnaire.likers.add(self.user)
+        for code in [1, 2]:
+            Answer.objects.create(
+                questionnaire=self.questionnaire,
+                question_key=question.key,
+                value="Answer",
+                code=code,
+            )
+
+        response = self.client.get(self.create_url + "?summary=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        result = response.data["results"][0]
+        self.assertNotIn("questions", result)
+        self.assertEqual(result["num_questions"], 1)
+        self.assertEqual(result["num_likers"], 1)
+        self.assertEqual(result["num_answers"], 2)
+
+        for summary in ("false", "0"):
+            response = self.client.get(self.create_url + "?summary=" + summary)
+            self.assertIn("questions", response.data["results"][0])
+
     def test_retrieve_questionnaire(self):
         retrieve_url = f"{self.create_url}{self.questionnaire.slug}/"
         response = self.client.get(retrieve_url)
@@ -216,6 +395,134 @@ class QuestionViewSetTestCase(TestCase):
         self.assertFalse(select_type.html_select)
         self.assertEqual(select_type.options.count(), 3)
 
+    def test_create_question_unknown_type(self):
+        data = [
+            {
+                "questionnaire": self.questionnaire.id,
+                "type": "DateType",
+                "label": "Test Date Question",
+                "sequence": 1,
+                "question_detail": {},
+            }
+        ]
+
+        response = self.client.post("/api/v1/question/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Question.objects.count(), 0)
+
+    def test_create_questions_in_bulk(self):
+        def question_data(sequence):
+            if sequence % 2:
+                return {
+                    "questionnaire": self.questionnaire.id,
+                    "type": "InputType",
+                    "label": f"Question {sequence}",
+                    "sequence": sequence,
+                    "question_detail": {"placeholder": "", "required": True},
+                }
+            return {
+                "questionnaire": self.questionnaire.id,
+                "type": "SelectType",
+                "label": f"Question {sequence}",
+                "sequence": sequence,
+                "question_detail": {
+                    "multiselect": False,
+                    "options": [{"value": "Yes"}, {"value": "No"}],
+                },
+            }
+
+        with CaptureQueriesContext(connection) as small_batch:
+            response = self.client.post(
+                "/api/v1/question/",
+                [question_data(sequence) for sequence in (1, 2)],
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as large_batch:
+            response = self.client.post(
+                "/api/v1/question/",
+                [question_data(sequence) for sequence in range(3, 23)],
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(large_batch), len(small_batch))
+
+        # The created options are returned without being read back
+        self.assertFalse(
+            any(
+                query["sql"].startswith("SELECT")
+                and '"option_value"' in query["sql"]
+                for query in large_batch.captured_queries
+            )
+        )
+
+        self.assertEqual(len(response.data["data"]), 20)
+        options = response.data["data"][1]["question_detail"]["options"]
+        self.assertEqual(
+            [option["value"] for option in options], ["Yes", "No"]
+        )
+        self.assertTrue(all(option["id"] for option in options))
+        self.assertEqual(Question.objects.count(), 22)
+        self.assertEqual(InputType.objects.count(), 11)
+        self.assertEqual(SelectType.objects.count(), 11)
+        self.assertEqual(OptionValue.objects.count(), 22)
+
+    def test_create_questions_in_bulk_invalid_item(self):
+        data = [
+            {
+                "questionnaire": self.questionnaire.id,
+                "type": "InputType",
+                "label": "Question 1",
+                "sequence": 1,
+                "question_detail": {},
+            },
+            {
+                "questionnaire": self.questionnaire.id,
+                "type": "InputType",
+                "sequence": 2,
+                "question_detail": {},
+            },
+        ]
+
+        response = self.client.post("/api/v1/question/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Question.objects.count(), 0)
+
+    def test_retrieve_questionnaire_query_count(self):
+        def create_questions(start, end):
+            for sequence in range(start, end):
+                question = Question.objects.create(
+                    questionnaire=self.questionnaire,
+                    type="SelectType" if sequence % 2 else "InputType",
+                    label=f"Question {sequence}",
+                    sequence=sequence,
+                )
+                if sequence % 2:
+                    select_type = SelectType.objects.create(
+                        question_key=question.key
+                    )
+                    OptionValue.objects.create(
+                        select_type=select_type, value="Option 1"
+                    )
+                else:
+                    InputType.objects.create(question_key=question.key)
+
+        url = f"/api/v1/questionnaire/{self.questionnaire.slug}/"
+        create_questions(1, 3)
+        with CaptureQueriesContext(connection) as two_questions:
+            self.client.get(url)
+
+        create_questions(3, 11)
+        with CaptureQueriesContext(connection) as ten_questions:
+            response = self.client.get(url)
+
+        self.assertEqual(len(response.data["data"]["questions"]), 10)
+        self.assertEqual(
+            len(ten_questions.captured_queries),
+            len(two_questions.captured_queries),
+        )
+
     def test_update_question(self):
         data = [
             {
@@ -278,6 +585,38 @@ class QuestionViewSetTestCase(TestCase):
         self.assertEqual(question1.sequence, 2)
         self.assertEqual(question2.sequence, 1)
 
+    def test_sequence_read_under_lock(self):
+        questions = [
+            Question.objects.create(
+                questionnaire=self.questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for sequence in (1, 2, 3)
+        ]
+        # Moved to the first position by another editor after being read
+        stale = Question.objects.get(pk=questions[2].pk)
+        Question.objects.filter(pk__in=[q.pk for q in questions[:2]]).update(
+            sequence=F("sequence") + 1
+        )
+        Question.objects.filter(pk=stale.pk).update(sequence=1)
+
+        with mock.patch.object(
+            QuestionViewSet, "get_object", return_value=stale
+        ):
+            response = self.client.delete(f"/api/v1/question/{stale.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(
+            list(
+                Question.objects.filter(
+                    questionnaire=self.questionnaire
+                ).values_list("label", "sequence")
+            ),
+            [("Question 1", 1), ("Question 2", 2)],
+        )
+
     def test_update_question_type_and_detail(self):
         question = Question.objects.create(
             questionnaire=self.questionnaire,
@@ -357,6 +696,54 @@ class QuestionViewSetTestCase(TestCase):
         self.assertTrue(select_type.html_select)
         self.assertEqual(select_type.options.count(), 2)
 
+    def test_update_question_options_diff(self):
+        question = Question.objects.create(
+            questionnaire=self.questionnaire,
+            type="SelectType",
+            label="Country",
+            sequence=1,
+        )
+        select_type = SelectType.objects.create(question_key=question.key)
+
+        def update_options(count):
+            options = OptionValue.objects.bulk_create(
+                OptionValue(select_type=select_type, value=f"Option {i}")
+                for i in range(count)
+            )
+            data = {
+                "type": "SelectType",
+                "sequence": 1,
+                "question_detail": {
+                    "options": [
+                        {"id": options[0].id, "value": "Renamed"},
+                        *[
+                            {"id": option.id, "value": option.value}
+                            for option in options[2:]
+                        ],
+                        {"value": "New 1"},
+                        {"value": "New 2"},
+                    ]
+                },
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(
+                    f"/api/v1/question/{question.id}/", data, format="json"
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return options, queries
+
+        _, small_update = update_options(3)
+        select_type.options.all().delete()
+        options, large_update = update_options(30)
+        self.assertEqual(len(large_update), len(small_update))
+
+        values = dict(select_type.options.values_list("id", "value"))
+        self.assertEqual(len(values), 31)
+        self.assertEqual(values[options[0].id], "Renamed")
+        self.assertNotIn(options[1].id, values)
+        self.assertEqual(values[options[29].id], "Option 29")
+        self.assertIn("New 2", values.values())
+
     def test_delete_question(self):
         question = Question.objects.create(
             questionnaire=self.questionnaire,
@@ -388,3 +775,178 @@ class QuestionViewSetTestCase(TestCase):
             question_key=question.key
         ).count()
         self.assertEqual(input_type_count, 0)
+
+    def test_delete_question_shifts_own_questionnaire_only(self):
+        other_questionnaire = Questionnaire.objects.create(
+            author=self.user, title="Other", slug="other"
+        )
+        questions = [
+            Question.objects.create(
+                questionnaire=questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for questionnaire in (self.questionnaire, other_questionnaire)
+            for sequence in (1, 2, 3)
+        ]
+
+        response = self.client.delete(f"/api/v1/question/{questions[0].id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(
+            list(
+                Question.objects.filter(
+                    questionnaire=self.questionnaire
+                ).values_list("sequence", flat=True)
+            ),
+            [1, 2],
+        )
+        self.assertEqual(
+            list(
+                Question.objects.filter(
+                    questionnaire=other_questionnaire
+                ).values_list("sequence", flat=True)
+            ),
+            [1, 2, 3],
+        )
+
+    def test_reorder_questions(self):
+        questions = [
+            Question.objects.create(
+                questionnaire=self.questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for sequence in (1, 2, 3)
+        ]
+        order = [questions[2].id, questions[0].id, questions[1].id]
+
+        response = self.client.patch(
+            "/api/v1/question/reorder/",
+            {"questionnaire": self.questionnaire.id, "questions": order},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [question["id"] for question in response.data["data"]], order
+        )
+        self.assertEqual(
+            list(
+                Question.objects.order_by("sequence").values_list(
+                    "id", flat=True
+                )
+            ),
+            order,
+        )
+
+    def test_reorder_questions_incomplete(self):
+        questions = [
+            Question.objects.create(
+                questionnaire=self.questionnaire,
+                type="InputType",
+                label=f"Question {sequence}",
+                sequence=sequence,
+            )
+            for sequence in (1, 2)
+        ]
+
+        response = self.client.patch(
+            "/api/v1/question/reorder/",
+            {
+                "questionnaire": self.questionnaire.id,
+                "questions": [questions[1].id],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        questions[1].refresh_from_db()
+        self.assertEqual(questions[1].sequence, 2)
+
+    def test_reorder_questions_non_author(self):
+        other_user = get_user_model().objects.create(
+            email="other@example.com", password="testpassword"
+        )
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.patch(
+            "/api/v1/question/reorder/",
+            {"questionnaire": self.questionnaire.id, "questions": []},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CountersTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.questionnaire = Questionnaire.objects.create(
+            author=self.user,
+            title="Test Questionnaire",
+            tags="tag1|tag2",
+        )
+
+    def test_increment_views(self):
+        increment_views(self.questionnaire)
+        with self.assertNumQueries(2):
+            increment_views(self.questionnaire)
+
+        self.assertEqual(self.questionnaire.views, 2)
+        self.questionnaire.refresh_from_db()
+        self.assertEqual(self.questionnaire.views, 2)
+
+        statistics = Statistics.objects.get(questionnaire=self.questionnaire)
+        self.assertEqual(statistics.views, 2)
+
+    def test_increment_downloads(self):
+        with self.assertNumQueries(1):
+            increment_downloads(self.questionnaire)
+
+        self.questionnaire.refresh_from_db()
+        self.assertEqual(self.questionnaire.downloads, 1)
+
+
+class QuestionnaireTagsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.questionnaire = Questionnaire.objects.create(
+            author=self.user,
+            title="Test Questionnaire",
+            tags="tag1|tag2",
+        )
+
+    def test_save_without_tags_change(self):
+        questionnaire = Questionnaire.objects.get(pk=self.questionnaire.pk)
+        questionnaire.views += 1
+
+        with self.assertNumQueries(1):
+            questionnaire.save()
+
+    def test_save_with_tags_change(self):
+        questionnaire = Questionnaire.objects.get(pk=self.questionnaire.pk)
+        questionnaire.tags = "tag2|tag3| tag3 |"
+        questionnaire.save()
+
+        self.assertEqual(
+            sorted(questionnaire.tag_set.values_list("name", flat=True)),
+            ["tag2", "tag3"],
+        )
+        self.assertEqual(Tags.objects.count(), 3)
+
+    def test_vocabulary(self):
+        self.assertEqual(Tags.objects.vocabulary(), {"tag1", "tag2"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Questionnaire.objects.create(
+                author=self.user, title="Other Questionnaire", tags="tag4"
+            )
+            self.assertEqual(Tags.objects.vocabulary(), {"tag1", "tag2"})
+        self.assertEqual(Tags.objects.vocabulary(), {"tag1", "tag2", "tag4"})
@@ -1,8 +1,9 @@
 import datetime
 import os
 
-from django.db.models import Count, Q
+from django.db.models import Count, OuterRef
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_http_date, parse_http_date_safe
 from firebase_admin import storage
 from onesignal_sdk.client import Client
 from rest_framework import status, viewsets
@@ -14,12 +15,18 @@ from rest_framework.response import Response
 from api.exceptions import QuestionnaireIdRequireExcepion, ThumbRequireExcepion
 from api.mixins import AuthenticationPermissionMixins
 from api.permissions import IsAuthorQuestionnaireOrReadOnly
-from api.utils import ObjectResponse, StatusResponse, try_except_wrapper
-from questionnaire.models import Questionnaire, Tags
+from api.utils import (ObjectResponse, StatusResponse, count_subquery,
+                       try_except_wrapper)
+from datasets.models import Answer
+from questionnaire.cache import etag_matches, get_all_tags_entry
+from questionnaire.models import Question, Questionnaire, Tags, parse_tags
+from questionnaire.search import search_questionnaires
 from questionnaire.serializer import (QuestionnaireLikersSerializer,
                                       QuestionnaireSerializer,
+                                      QuestionnaireSummarySerializer,
                                       QuestionnaireThumbSerializer,
-                                      TagsSerializer)
+                                      TagsSerializer,
+                                      get_questionnaire_context)
 
 
 class QuestionnaireViewSet(
@@ -53,7 +60,15 @@ class QuestionnaireViewSet(
         is_collecting = request.query_params.get("is_collecting") or ""
         min_questions = request.query_params.get("min_questions") or ""
         max_questions = request.query_params.get("max_questions") or ""
-        questionnaires = Questionnaire.objects.filter(title__icontains=key)
+        tags_match = request.query_params.get("tags_match") or "any"
+        summary = request.query_params.get("summary", "").lower() in (
+            "1",
+            "true",
+        )
+        questionnaires = Questionnaire.objects.all()
+
+        if key:
+            questionnaires = search_questionnaires(questionnaires, key)
 
         if is_collecting:
             questionnaires = questionnaires.filter(is_collecting=is_collecting)
@@ -62,11 +77,9 @@ class QuestionnaireViewSet(
             questionnaires = questionnaires.filter(author=user_id)
 
         if tags:
-            tag_list = tags.split("|")
-            q_objects = Q()
-            for tag in tag_list:
-                q_objects |= Q(tags__icontains=tag)
-            questionnaires = questionnaires.filter(q_objects)
+            questionnaires = self.filter_tags(
+                questionnaires, parse_tags(tags), tags_match == "all"
+            )
 
         if min_questions:
             questionnaires = questionnaires.annotate(
@@ -84,14 +97,82 @@ class QuestionnaireViewSet(
                 num_questions_count__lte=int(max_questions)
             )
 
+        if summary:
+            return self.list_summary(questionnaires)
+
+        questionnaires = questionnaires.select_related(
+            "author"
+        ).prefetch_related("questions", "likers", "statistic_views")
+
         page = self.paginate_queryset(questionnaires)
         if page is not None:
             questionnaires_serializer = QuestionnaireSerializer(
-                page, many=True
+                page, many=True, context=get_questionnaire_context(page)
             )
             return self.get_paginated_response(questionnaires_serializer.data)
 
         questionnaires_serializer = QuestionnaireSerializer(
+            questionnaires,
+            many=True,
+            context=get_questionnaire_context(questionnaires),
+        )
+
+        return Response(
+            ObjectResponse(
+                StatusResponse.STATUS_SUCCESS,
+                "Get questionnaire successfully!",
+                questionnaires_serializer.data,
+            ).get_json(),
+            status=status.HTTP_200_OK,
+        )
+
+    def filter_tags(self, questionnaires, tag_list, match_all=False):
+        """
+        Keep questionnaires having any (or all) of the tags, looked up
+        through the questionnaire_tags relation
+        """
+        questionnaire_tags = Questionnaire.tag_set.through.objects.filter(
+            tags__name__in=tag_list
+        ).values("questionnaire")
+        if match_all:
+            questionnaire_tags = (
+                questionnaire_tags.annotate(
+                    num_tags=Count("tags", distinct=True)
+                )
+                .filter(num_tags=len(tag_list))
+                .values("questionnaire")
+            )
+
+        return questionnaires.filter(pk__in=questionnaire_tags)
+
+    def list_summary(self, questionnaires):
+        """
+        Compact listing for the browse cards: counts of questions, likers
+        and answers are annotated instead of serializing the relations
+        """
+        questionnaires = questionnaires.select_related("author").annotate(
+            num_questions=count_subquery(
+                Question.objects.filter(questionnaire=OuterRef("pk"))
+            ),
+            num_likers=count_subquery(
+                Questionnaire.likers.through.objects.filter(
+                    questionnaire=OuterRef("pk")
+                )
+            ),
+            num_answers=count_subquery(
+                Answer.objects.filter(questionnaire=OuterRef("pk")),
+                field="code",
+            ),
+        )
+
+        page = self.paginate_queryset(questionnaires)
+        if page is not None:
+            questionnaires_serializer = QuestionnaireSummarySerializer(
+                page, many=True
+            )
+            return self.get_paginated_response(questionnaires_serializer.data)
+
+        questionnaires_serializer = QuestionnaireSummarySerializer(
             questionnaires, many=True
         )
 
@@ -107,9 +188,12 @@ class QuestionnaireViewSet(
     def retrieve(self, request, *args, **kwargs):
         questionnaire_slug = self.kwargs.get("pk")
         questionnaire = get_object_or_404(
-            Questionnaire, slug=questionnaire_slug
+            Questionnaire.objects.prefetch_related("questions"),
+            slug=questionnaire_slug,
+        )
+        questionnaire_serializer = QuestionnaireSerializer(
+            questionnaire, context=get_questionnaire_context([questionnaire])
         )
-        questionnaire_serializer = QuestionnaireSerializer(questionnaire)
 
         return Response(
             ObjectResponse(
@@ -172,18 +256,44 @@ class QuestionnaireViewSet(
     )
     @try_except_wrapper
     def get_all_tags(self, request):
-        tags = Tags.objects.all()
-        serializer = TagsSerializer(tags, many=True)
+        entry = get_all_tags_entry(self.build_all_tags)
+        headers = {
+            "ETag": entry["etag"],
+            "Last-Modified": entry["last_modified"],
+            "Cache-Control": "no-cache",
+        }
+
+        if_none_match = request.headers.get("If-None-Match")
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since") or ""
+        )
+        if (if_none_match and etag_matches(if_none_match, entry["etag"])) or (
+            not if_none_match
+            and if_modified_since
+            and if_modified_since >= parse_http_date(entry["last_modified"])
+        ):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
 
         return Response(
             ObjectResponse(
                 StatusResponse.STATUS_SUCCESS,
                 "Get all tags successfully.",
-                serializer.data,
+                entry["data"],
             ).get_json(),
             status=status.HTTP_200_OK,
+            headers=headers,
         )
 
+    def build_all_tags(self):
+        tags = Tags.objects.annotate(
+            num_questionnaires=Count("questionnaires")
+        ).order_by("name")
+        serializer = TagsSerializer(tags, many=True)
+
+        return [dict(tag) for tag in serializer.data]
+
     @action(
         methods=["PATCH"],
         url_path="like",
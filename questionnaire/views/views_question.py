@@ -1,15 +1,19 @@
-from django.apps import apps
-from django.db.models import Q
-from rest_framework import status, viewsets
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from api.exceptions import PermissionDeniedException
 from api.mixins import AuthenticationPermissionMixins
 from api.permissions import IsAuthorQuestionOrReadOnly
 from api.utils import ObjectResponse, StatusResponse
-from questionnaire.models import OptionValue, Question
-from questionnaire.serializer import (InputTypeSerializer, QuestionSerializer,
-                                      SelectTypeSerializer)
+from questionnaire.bulk import bulk_create_questions
+from questionnaire.models import Question, Questionnaire
+from questionnaire.registry import get_question_type
+from questionnaire.serializer import (QuestionSerializer,
+                                      get_question_details)
 
 
 class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
@@ -18,21 +22,17 @@ class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
     lookup_field = "pk"
     permission_classes = [IsAuthorQuestionOrReadOnly]
 
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
-        list_question = []
-
         # Update "sequence" for all questions gte this new question
         if len(request.data) == 1:
-            list_question_gte = Question.objects.filter(
-                Q(sequence__gte=request.data[0]["sequence"])
-                & Q(questionnaire=request.data[0]["questionnaire"])
-            )
-            for question in list_question_gte:
-                question.sequence += 1
-                question.save()
+            self.lock_questionnaire(request.data[0]["questionnaire"])
+            Question.objects.filter(
+                questionnaire=request.data[0]["questionnaire"],
+                sequence__gte=request.data[0]["sequence"],
+            ).update(sequence=F("sequence") + 1)
 
-        for question in request.data:
-            list_question.append(self.handle_create(request, question))
+        list_question = bulk_create_questions(request.data, request.user)
 
         return Response(
             ObjectResponse(
@@ -43,76 +43,38 @@ class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED,
         )
 
-    def handle_create(self, request, data, *args, **kwargs):
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-
-        if (
-            serializer.validated_data.get("questionnaire").author
-            != request.user
-        ):
-            raise PermissionDeniedException
-
-        serializer.save(create_by=request.user)
-
-        Model = apps.get_model(
-            app_label="questionnaire", model_name=serializer.data.get("type")
-        )
-
-        if Model is not None:
-            serializer_class = globals()[f"{Model.__name__}Serializer"]
-            question_detail = serializer_class(
-                data=data.get("question_detail"),
-                context={
-                    "options": data.get("question_detail")["options"]
-                    if "options" in data.get("question_detail")
-                    else ""
-                },
-            )
-            question_detail.is_valid(raise_exception=True)
-            question_detail.save(question_key=serializer.data.get("key"))
-
-        question_instance = Question.objects.get(id=serializer.data["id"])
-        question_serializer = QuestionSerializer(question_instance)
-
-        return question_serializer.data
-
+    @transaction.atomic
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
+        self.lock_questionnaire(instance.questionnaire_id)
+        # Re-read under the lock, a concurrent editor may have moved it
+        instance = get_object_or_404(Question, pk=instance.pk)
 
         # Update the sequence between the new position and the old position
         if request.data["sequence"] != instance.sequence:
             old_idx = instance.sequence
             new_idx = request.data["sequence"]
-            list_question_change = Question.objects.filter(
+            Question.objects.filter(
                 Q(sequence__gte=min(old_idx, new_idx))
                 & Q(sequence__lte=max(old_idx, new_idx))
                 & Q(questionnaire=instance.questionnaire)
                 & ~Q(id=instance.id)
-            )
-            for question in list_question_change:
-                question.sequence += (old_idx - new_idx) / abs(
-                    old_idx - new_idx
-                )
-                question.save()
+            ).update(sequence=F("sequence") + (1 if old_idx > new_idx else -1))
 
         # Remove old type model
         if request.data["type"] != instance.type:
-            Model = apps.get_model(
-                app_label="questionnaire", model_name=instance.type
-            )
+            question_type = get_question_type(instance.type)
 
-            if Model is not None:
-                Model.objects.filter(question_key=instance.key).delete()
+            if question_type is not None:
+                question_type.model.objects.filter(
+                    question_key=instance.key
+                ).delete()
 
             # Create new
-            Model = apps.get_model(
-                app_label="questionnaire", model_name=request.data["type"]
-            )
+            question_type = get_question_type(request.data["type"])
 
-            if Model is not None:
-                serializer_class = globals()[f"{Model.__name__}Serializer"]
-                question_detail = serializer_class(
+            if question_type is not None:
+                question_detail = question_type.serializer_class(
                     data=request.data["question_detail"],
                     context={
                         "options": request.data["question_detail"]["options"]
@@ -149,16 +111,13 @@ class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        Model = apps.get_model(
-            app_label="questionnaire", model_name=instance.type
-        )
+        question_type = get_question_type(instance.type)
 
-        if Model is not None:
-            question_detail_instance = Model.objects.get(
+        if question_type is not None:
+            question_detail_instance = question_type.model.objects.get(
                 question_key=instance.key
             )
-            serializer_class = globals()[f"{Model.__name__}Serializer"]
-            question_detail = serializer_class(
+            question_detail = question_type.serializer_class(
                 question_detail_instance,
                 data=data.get("question_detail"),
                 partial=True,
@@ -173,22 +132,24 @@ class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
 
         return QuestionSerializer(instance).data
 
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
+        self.lock_questionnaire(instance.questionnaire_id)
+        # Re-read under the lock, a concurrent editor may have moved it
+        instance = get_object_or_404(Question, pk=instance.pk)
 
-        Model = apps.get_model(
-            app_label="questionnaire", model_name=instance.type
-        )
+        question_type = get_question_type(instance.type)
 
-        if Model is not None:
-            Model.objects.filter(question_key=instance.key).delete()
+        if question_type is not None:
+            question_type.model.objects.filter(
+                question_key=instance.key
+            ).delete()
 
-        list_question_change = Question.objects.filter(
-            sequence__gt=instance.sequence
-        )
-        for question in list_question_change:
-            question.sequence -= 1
-            question.save()
+        Question.objects.filter(
+            questionnaire=instance.questionnaire,
+            sequence__gt=instance.sequence,
+        ).update(sequence=F("sequence") - 1)
 
         instance.delete()
 
@@ -200,3 +161,70 @@ class QuestionViewSet(AuthenticationPermissionMixins, viewsets.ModelViewSet):
             ).get_json(),
             status=status.HTTP_204_NO_CONTENT,
         )
+
+    @action(
+        methods=["PATCH"],
+        url_path="reorder",
+        url_name="reorder-question",
+        detail=False,
+    )
+    @transaction.atomic
+    def reorder(self, request):
+        """
+        Set the sequence of every question of a questionnaire from the
+        full list of its question ids, in the new order
+        """
+        questionnaire = self.lock_questionnaire(
+            request.data.get("questionnaire")
+        )
+        if questionnaire.author != request.user:
+            raise PermissionDeniedException
+
+        question_ids = request.data.get("questions") or []
+        questions = Question.objects.filter(questionnaire=questionnaire)
+        if sorted(question_ids) != sorted(
+            questions.values_list("id", flat=True)
+        ):
+            raise serializers.ValidationError(
+                {
+                    "questions": [
+                        "Must list every question of the questionnaire once."
+                    ]
+                }
+            )
+
+        questions.update(
+            sequence=Case(
+                *[
+                    When(id=question_id, then=Value(sequence))
+                    for sequence, question_id in enumerate(
+                        question_ids, start=1
+                    )
+                ]
+            )
+        )
+
+        questions = list(questions.order_by("sequence"))
+        serializer = QuestionSerializer(
+            questions,
+            many=True,
+            context={"question_details": get_question_details(questions)},
+        )
+
+        return Response(
+            ObjectResponse(
+                StatusResponse.STATUS_SUCCESS,
+                "Reorder question successfully!",
+                serializer.data,
+            ).get_json(),
+            status=status.HTTP_200_OK,
+        )
+
+    def lock_questionnaire(self, questionnaire):
+        """
+        Lock the questionnaire row until the end of the transaction so that
+        concurrent editors change its question sequences one at a time
+        """
+        return get_object_or_404(
+            Questionnaire.objects.select_for_update(), pk=questionnaire
+        )
@@ -0,0 +1,4 @@
+from .models import UploadJob
+from django.contrib import admin
+
+admin.site.register(UploadJob)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+from upload.inference import ColumnType, classify_columns
+
+# Bump when the inference rules change, so cached types are recomputed
+INFERENCE_VERSION = 1
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class LRUCache:
+    """
+    Mapping bounded to `maxsize` entries, evicting the least recently used
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_column_types = LRUCache(
+    getattr(settings, "UPLOAD_SCHEMA_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+)
+
+
+def column_cache_key(column):
+    """
+    Cache key of a cleaned column (values without the header), from the
+    hash of its values
+    """
+    content = json.dumps(column, default=str, ensure_ascii=False)
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f"column_type:{INFERENCE_VERSION}:{digest}"
+
+
+def get_persistent_cache():
+    """
+    Cache backend shared by the processes, when UPLOAD_SCHEMA_CACHE names
+    one of CACHES
+    """
+    alias = getattr(settings, "UPLOAD_SCHEMA_CACHE", None)
+    if alias:
+        return caches[alias]
+
+
+def cached_classify_columns(columns, workers=1):
+    """
+    classify_columns() through the in-process LRU cache and the optional
+    persistent cache: each distinct column is classified at most once.
+    """
+    columns = list(columns)
+    keys = [column_cache_key(column) for column in columns]
+
+    column_types = {}
+    for key in keys:
+        column_type = _column_types.get(key)
+        if column_type is not None:
+            column_types[key] = column_type
+
+    missing = [key for key in dict.fromkeys(keys) if key not in column_types]
+    persistent_cache = get_persistent_cache()
+    if missing and persistent_cache is not None:
+        for key, value in persistent_cache.get_many(missing).items():
+            column_types[key] = ColumnType(*value)
+            _column_types.set(key, column_types[key])
+        missing = [key for key in missing if key not in column_types]
+
+    if missing:
+        columns_by_key = dict(zip(keys, columns))
+        classified = dict(
+            zip(
+                missing,
+                classify_columns(
+                    [columns_by_key[key] for key in missing], workers=workers
+                ),
+            )
+        )
+        for key, column_type in classified.items():
+            _column_types.set(key, column_type)
+        if persistent_cache is not None:
+            persistent_cache.set_many(
+                {key: tuple(value) for key, value in classified.items()},
+                timeout=getattr(
+                    settings,
+                    "UPLOAD_SCHEMA_CACHE_TIMEOUT",
+                    DEFAULT_CACHE_TIMEOUT,
+                ),
+            )
+        column_types.update(classified)
+
+    return [column_types[key] for key in keys]
@@ -0,0 +1,220 @@
+import math
+import multiprocessing
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+# Above this number of distinct values a column is reduced to an evenly
+# spaced sample of as many rows, which bounds the similarity product
+MAX_DISTINCT_VALUES = 1000
+
+# np.isclose(similarity, 1, rtol=1e-2, atol=1e-2)
+SIMILAR_THRESHOLD = 1 - 2e-2
+
+# check_question_type thresholds on the similarity metrics
+MEAN_SIMILAR_SELECT = 0.25
+SIMILAR_RATIO_MULTI = 0.4
+
+# Tokens of the default CountVectorizer / TfidfVectorizer
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+class ColumnType(NamedTuple):
+    """
+    Question type inferred for a column and the tier that decided it:
+    "number", "cardinality" or "similarity"
+    """
+
+    type: str
+    tier: str
+
+
+def sample_rows(strings, size=MAX_DISTINCT_VALUES):
+    """
+    Deterministic sample of `size` rows taken at regular intervals
+    """
+    step = math.ceil(len(strings) / size)
+    return strings[::step]
+
+
+def similarity_metrics(strings):
+    """
+    TF-IDF cosine similarity metrics of a column, as if computed over the
+    full row x row similarity matrix.
+
+    Rows are grouped by distinct value: each distinct value is vectorized
+    once and weighted by its frequency. The mean similarity is the squared
+    norm of the weighted mean vector, the share of near-identical pairs
+    comes from the sparse similarity of the distinct values only.
+    """
+    frequencies = Counter(strings)
+    if len(frequencies) > MAX_DISTINCT_VALUES:
+        frequencies = Counter(sample_rows(strings))
+
+    values = list(frequencies)
+    counts = np.array([frequencies[value] for value in values], dtype=float)
+    num_rows = counts.sum()
+
+    # Same weights as TfidfVectorizer (smooth idf, l2 norm) fitted on rows
+    term_counts = CountVectorizer().fit_transform(values)
+    document_frequency = (term_counts > 0).T @ counts
+    idf = np.log((1 + num_rows) / (1 + document_frequency)) + 1
+    tfidf = normalize(term_counts.multiply(idf).tocsr())
+
+    weighted_sum = tfidf.T @ counts
+    similar_ratio = weighted_sum @ weighted_sum / num_rows**2
+
+    similarity = (tfidf @ tfidf.T).tocoo()
+    similar = similarity.data >= SIMILAR_THRESHOLD
+    num_similar = np.sum(
+        counts[similarity.row[similar]] * counts[similarity.col[similar]]
+    )
+
+    commas_count = sum(
+        value.count(", ") * count for value, count in zip(values, counts)
+    )
+
+    return {
+        "similar_ratio": similar_ratio,
+        "mean_similar": num_similar / num_rows**2,
+        "mean_commas": commas_count / num_rows,
+    }
+
+
+def cardinality_type(strings):
+    """
+    Question type of a text column decided from its value counts alone,
+    or None when the similarity metrics are needed.
+
+    Rows with the same (tokenized) value have a similarity of 1, so their
+    share of the pairs is a lower bound of "mean_similar". When no token
+    is shared by two distinct values every other pair has a similarity of
+    0 and both metrics are equal to that share.
+    """
+    if not strings:
+        return None
+
+    frequencies = Counter(strings)
+    tokens = {
+        value: set(TOKEN_PATTERN.findall(value.lower()))
+        for value in frequencies
+    }
+    identical_share = (
+        sum(count**2 for value, count in frequencies.items() if tokens[value])
+        / len(strings) ** 2
+    )
+
+    if identical_share >= MEAN_SIMILAR_SELECT:
+        return "SelectType"
+
+    token_frequencies = Counter(
+        token for value_tokens in tokens.values() for token in value_tokens
+    )
+    if all(count == 1 for count in token_frequencies.values()):
+        # identical_share < MEAN_SIMILAR_SELECT < SIMILAR_RATIO_MULTI
+        return "InputType"
+
+    return None
+
+
+def is_number_input(data):
+    """
+    Check every item of data can be converted to int
+    """
+    for item in data:
+        try:
+            int(item)
+        except ValueError:
+            return False
+    return True
+
+
+def number_column_type(data, flat_data):
+    """
+    Question type of a column of numbers: `data` holds the ", " split
+    items of every row and `flat_data` all of them
+    """
+    for item in data:
+        if len(item) > 1:
+            return "SelectType-multi"
+
+    unique_values, counts = np.unique(flat_data, return_counts=True)
+    total_frequency = np.sum(counts)
+
+    # Mean number of occurrences of a value
+    mean_frequency = total_frequency / len(counts)
+    if mean_frequency <= 1.5:
+        return "InputType"
+    return "SelectType"
+
+
+def similarity_type(strings):
+    result = similarity_metrics(strings)
+    if result["mean_similar"] >= MEAN_SIMILAR_SELECT:
+        return "SelectType"
+    if result["similar_ratio"] >= SIMILAR_RATIO_MULTI:
+        return "SelectType-multi"
+    return "InputType"
+
+
+def classify_column(data):
+    """
+    Question type of a column of answers (without its header), from the
+    cheapest test that decides it: numbers, then value counts, then the
+    similarity metrics
+    """
+    data_process = [item.split(", ") for item in data]
+    flat_data = []
+    for sublist in data_process:
+        flat_data.extend(sublist)
+
+    if is_number_input(flat_data):
+        return ColumnType(
+            number_column_type(data_process, flat_data), "number"
+        )
+
+    type_question = cardinality_type(data)
+    if type_question is not None:
+        return ColumnType(type_question, "cardinality")
+
+    return ColumnType(similarity_type(data), "similarity")
+
+
+_executors = {}
+
+
+def get_executor(workers):
+    """
+    Process pool shared by the requests of this process. Workers are
+    spawned, not forked, so they inherit no database connection.
+    """
+    executor = _executors.get(workers)
+    if executor is None:
+        executor = _executors[workers] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return executor
+
+
+def classify_columns(columns, workers=1):
+    """
+    ColumnType of each column, in column order. With more than one
+    worker the columns are classified concurrently in a process pool.
+    """
+    columns = list(columns)
+    if workers <= 1 or len(columns) <= 1:
+        return [classify_column(column) for column in columns]
+
+    try:
+        return list(get_executor(workers).map(classify_column, columns))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory): start a new pool next time
+        _executors.pop(workers, None)
+        return [classify_column(column) for column in columns]
@@ -0,0 +1,123 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from datasets.codes import allocate_codes
+from datasets.models import Answer
+from datasets.statistics import update_statistics
+from datasets.submissions import save_submissions
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ColumnSchema:
+    """
+    Validation rules of a sheet column, precomputed once from the
+    serialized question it is answering.
+    """
+
+    def __init__(self, question):
+        question_detail = question["question_detail"] or {}
+
+        self.key = question["key"]
+        self.type = question["type"]
+        self.required = question_detail.get("required", False)
+        self.multiselect = question_detail.get("multiselect", False)
+        self.other_field = question_detail.get("other_field", False)
+        self.options = Counter(
+            option["value"] for option in question_detail.get("options", [])
+        )
+
+    def is_valid(self, item):
+        if item is None:
+            return not self.required
+
+        if self.type != "SelectType":
+            return True
+
+        item = str(item)
+        if self.multiselect:
+            # Every option can consume one chosen value, the rest are "other"
+            others = sum(
+                max(count - self.options[value], 0)
+                for value, count in Counter(item.split(", ")).items()
+            )
+            if self.other_field:
+                return others <= 1
+            return others == 0
+
+        return self.other_field or item in self.options
+
+
+def to_answer_value(item):
+    """
+    Convert a cell value the same way AnswerSerializer.value does
+    """
+    if item is None:
+        return None
+    if isinstance(item, bool) or not isinstance(item, (str, int, float)):
+        raise serializers.ValidationError({"value": ["Not a valid string."]})
+    return str(item).strip()
+
+
+def insert_answers(answers):
+    Answer.objects.bulk_create(answers, batch_size=len(answers))
+    update_statistics(answers)
+    save_submissions(answers)
+    return len(answers)
+
+
+def bulk_create_answers(
+    questionnaire_id, questions, rows, answer_by=None, batch_size=None
+):
+    """
+    Validate rows against the questions schema and insert their answers
+    with batched bulk_create inside a single transaction.
+
+    A block of response codes, one per row, is reserved up front in its
+    own short transaction, so the response counter is not locked while
+    the rows are inserted and answers submitted meanwhile get the codes
+    after the block. Row i uses the i-th code of the block; rows with an
+    invalid cell are skipped and leave their code unused, as do all the
+    codes of a failed import. Returns the number of answers created.
+    """
+    schema = [ColumnSchema(question) for question in questions]
+    batch_size = batch_size or getattr(
+        settings, "UPLOAD_ANSWER_BATCH_SIZE", DEFAULT_BATCH_SIZE
+    )
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    first_code = allocate_codes(questionnaire_id, len(rows))
+
+    created = 0
+    batch = []
+    with transaction.atomic():
+        for code, row in enumerate(rows, start=first_code):
+            if not all(
+                column.is_valid(item) for column, item in zip(schema, row)
+            ):
+                continue
+
+            for column, item in zip(schema, row):
+                batch.append(
+                    Answer(
+                        questionnaire_id=questionnaire_id,
+                        answer_by=answer_by,
+                        question_key=column.key,
+                        value=to_answer_value(item),
+                        code=code,
+                    )
+                )
+
+            if len(batch) >= batch_size:
+                created += insert_answers(batch)
+                batch = []
+
+        if batch:
+            created += insert_answers(batch)
+
+    return created
@@ -0,0 +1,147 @@
+import threading
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from upload.models import UploadJob
+from upload.sheet import load_sheet
+
+
+def enqueue_upload_job(kind, file, questionnaire, create_by):
+    """
+    Store an uploaded file as a pending job for the run_upload_jobs worker
+    """
+    return UploadJob.objects.create(
+        kind=kind,
+        questionnaire=questionnaire,
+        create_by=create_by,
+        file_name=getattr(file, "name", "") or "",
+        content=file.read(),
+    )
+
+
+def reap_stale_jobs(timeout):
+    """
+    Fail the running jobs without a heartbeat for more than `timeout`
+    seconds, left so by a worker killed while processing them. They are
+    not retried: a sheet that killed a worker would most likely kill the
+    next one too. Returns the number of jobs failed.
+    """
+    now = timezone.now()
+    return UploadJob.objects.filter(
+        status=UploadJob.STATUS_RUNNING,
+        update_at__lt=now - timedelta(seconds=timeout),
+    ).update(
+        status=UploadJob.STATUS_FAILED,
+        error="Upload job timed out.",
+        content=None,
+        finish_at=now,
+    )
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job as running and return it, or None.
+    Rows locked by another worker are skipped, so several workers can
+    poll the same table.
+    """
+    with transaction.atomic():
+        job = (
+            UploadJob.objects.select_for_update(skip_locked=True)
+            .filter(status=UploadJob.STATUS_PENDING)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = UploadJob.STATUS_RUNNING
+        job.start_at = timezone.now()
+        job.save(update_fields=["status", "start_at", "update_at"])
+    return job
+
+
+def update_job(job, **fields):
+    """
+    Save the given progress fields of a job, outside of any processing
+    transaction so they are visible to the status endpoint right away
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[*fields, "update_at"])
+
+
+def finish_job(job, **fields):
+    """
+    Record the outcome of a running job and drop its file. A job failed
+    meanwhile by reap_stale_jobs is left failed and reloaded.
+    """
+    now = timezone.now()
+    fields.update(content=None, finish_at=now, update_at=now)
+    if UploadJob.objects.filter(
+        pk=job.pk, status=UploadJob.STATUS_RUNNING
+    ).update(**fields):
+        for name, value in fields.items():
+            setattr(job, name, value)
+    else:
+        job.refresh_from_db()
+
+
+def send_heartbeats(job_id, stop, interval):
+    """
+    Touch update_at of a running job every `interval` seconds until `stop`
+    is set. Runs in its own thread, hence on its own database connection,
+    so the beats are committed while the job holds a long transaction.
+    """
+    try:
+        while not stop.wait(interval):
+            UploadJob.objects.filter(
+                pk=job_id, status=UploadJob.STATUS_RUNNING
+            ).update(update_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_job(job, process):
+    """
+    Process a claimed job with `process(job, sheet, progress)`, where
+    `progress(**fields)` reports its progress, and record the outcome.
+    The uploaded file is dropped once the job is finished.
+    """
+    stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=send_heartbeats,
+        args=(
+            job.pk,
+            stop,
+            getattr(settings, "UPLOAD_JOB_HEARTBEAT_INTERVAL", 60),
+        ),
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        update_job(job, stage="parsing")
+        sheet = load_sheet(BytesIO(job.content))
+        update_job(job, total_rows=max(sheet.max_row - 1, 0))
+
+        process(job, sheet, lambda **fields: update_job(job, **fields))
+    except Exception as errors:
+        finish_job(
+            job,
+            status=UploadJob.STATUS_FAILED,
+            error=(
+                str(errors.detail)
+                if isinstance(errors, APIException)
+                else str(errors)
+            ),
+        )
+    else:
+        finish_job(job, status=UploadJob.STATUS_SUCCEEDED, stage="done")
+    finally:
+        stop.set()
+        heartbeat.join()
+    return job
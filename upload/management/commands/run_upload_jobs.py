@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from upload.jobs import claim_next_job, reap_stale_jobs, run_job
+from upload.models import UploadJob
+from upload.views import UploadViewSet
+
+
+class Command(BaseCommand):
+    help = "Process the pending upload jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is pending instead of polling.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when no job is pending.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=getattr(settings, "UPLOAD_JOB_TIMEOUT", 600),
+            help="Seconds without a heartbeat after which a running job "
+            "is considered dead and failed.",
+        )
+
+    def handle(self, *args, **options):
+        view = UploadViewSet()
+        while True:
+            reaped = reap_stale_jobs(options["timeout"])
+            if reaped:
+                self.stderr.write(f"Failed {reaped} timed out upload jobs")
+
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+                continue
+
+            run_job(job, view.process_upload_job)
+            if job.status == UploadJob.STATUS_SUCCEEDED:
+                self.stdout.write(f"Upload job {job.pk} succeeded")
+            else:
+                self.stderr.write(f"Upload job {job.pk} failed: {job.error}")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
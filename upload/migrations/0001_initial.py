@@ -0,0 +1,97 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("questionnaire", "0026_questionnaire_tag_set"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("question", "Question"),
+                            ("answer", "Answer"),
+                            ("datasets", "Datasets"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                (
+                    "file_name",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("content", models.BinaryField(null=True)),
+                ("total_rows", models.IntegerField(null=True)),
+                ("imported_rows", models.IntegerField(null=True)),
+                ("num_questions", models.IntegerField(null=True)),
+                ("num_answers", models.IntegerField(null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                ("create_at", models.DateTimeField(auto_now_add=True)),
+                ("start_at", models.DateTimeField(null=True)),
+                ("finish_at", models.DateTimeField(null=True)),
+                (
+                    "create_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upload_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "questionnaire",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upload_jobs",
+                        to="questionnaire.questionnaire",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "upload_job",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "id"], name="upload_job_status_idx"
+                    )
+                ],
+            },
+        ),
+    ]
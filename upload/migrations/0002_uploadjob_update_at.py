@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("upload", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadjob",
+            name="update_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import models
+
+from authentication.models import User
+from questionnaire.models import Questionnaire
+
+
+class UploadJob(models.Model):
+    """
+    Upload of a sheet processed by the run_upload_jobs worker: the file is
+    kept in `content` until the job is finished, progress is reported
+    through `stage` and the row counts.
+    """
+
+    KIND_QUESTION = "question"
+    KIND_ANSWER = "answer"
+    KIND_DATASETS = "datasets"
+    KIND_CHOICES = [
+        (KIND_QUESTION, "Question"),
+        (KIND_ANSWER, "Answer"),
+        (KIND_DATASETS, "Datasets"),
+    ]
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    questionnaire = models.ForeignKey(
+        Questionnaire, on_delete=models.CASCADE, related_name="upload_jobs"
+    )
+    create_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="upload_jobs"
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    stage = models.CharField(max_length=20, blank=True, default="")
+    file_name = models.CharField(max_length=255, blank=True, default="")
+    content = models.BinaryField(null=True)
+
+    total_rows = models.IntegerField(null=True)
+    imported_rows = models.IntegerField(null=True)
+    num_questions = models.IntegerField(null=True)
+    num_answers = models.IntegerField(null=True)
+    error = models.TextField(blank=True, default="")
+
+    create_at = models.DateTimeField(auto_now_add=True)
+    # Heartbeat of the worker running the job, see reap_stale_jobs
+    update_at = models.DateTimeField(auto_now=True)
+    start_at = models.DateTimeField(null=True)
+    finish_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = "upload_job"
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["status", "id"], name="upload_job_status_idx"
+            ),
+        ]
@@ -0,0 +1,25 @@
+from rest_framework import serializers
+
+from upload.models import UploadJob
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadJob
+        fields = [
+            "id",
+            "questionnaire",
+            "kind",
+            "status",
+            "stage",
+            "file_name",
+            "total_rows",
+            "imported_rows",
+            "num_questions",
+            "num_answers",
+            "error",
+            "create_at",
+            "start_at",
+            "finish_at",
+        ]
+        read_only_fields = fields
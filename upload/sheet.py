@@ -0,0 +1,78 @@
+from openpyxl import load_workbook
+
+
+class SheetData:
+    """
+    Read-only view of the active worksheet of an uploaded workbook,
+    with empty rows and columns already dropped.
+
+    Mirrors the part of the openpyxl worksheet API used by UploadViewSet
+    (iter_rows, iter_cols, max_row, max_column, delete_cols) so handlers
+    can work on it without holding the workbook object model in memory.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @property
+    def max_row(self):
+        return len(self.rows)
+
+    @property
+    def max_column(self):
+        return len(self.rows[0]) if self.rows else 0
+
+    def iter_rows(self, values_only=True):
+        return iter(self.rows)
+
+    def iter_cols(self, values_only=True):
+        return zip(*self.rows)
+
+    def delete_cols(self, idx, amount=1):
+        start = idx - 1
+        self.rows = [row[:start] + row[start + amount :] for row in self.rows]
+
+
+def load_sheet(file):
+    """
+    Load the active sheet of a XLSX file in a single streaming pass.
+
+    The workbook is opened in read-only mode, empty rows are skipped while
+    iterating and empty columns are tracked on the way, so the sheet is
+    never mutated and the cost is linear in the number of cells.
+
+    The cell values are kept in memory, so memory is still linear in the
+    size of the sheet (without the openpyxl cell objects). This is on
+    purpose: an empty column is only known once the last row is read,
+    the column types are inferred from whole columns (value counts, evenly
+    spaced samples) before the first answer is checked against them, and
+    create_datasets reads the sheet twice, for the questions and for the
+    answers.
+    """
+    workbook = load_workbook(file, read_only=True, data_only=True)
+
+    rows = []
+    used_columns = []
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            if all(cell is None for cell in row):
+                continue
+
+            if len(row) > len(used_columns):
+                used_columns.extend([False] * (len(row) - len(used_columns)))
+            for idx, cell in enumerate(row):
+                if cell is not None:
+                    used_columns[idx] = True
+
+            rows.append(row)
+    finally:
+        workbook.close()
+
+    keep = [idx for idx, used in enumerate(used_columns) if used]
+
+    return SheetData(
+        [
+            tuple(row[idx] if idx < len(row) else None for idx in keep)
+            for row in rows
+        ]
+    )
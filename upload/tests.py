@@ -1,8 +1,37 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO, StringIO
+from random import Random
+from unittest import mock
+
+import numpy as np
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+from openpyxl import Workbook
 from rest_framework import status
 from rest_framework.test import APITestCase
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
 
-from questionnaire.models import Questionnaire
+from datasets.codes import allocate_codes
+from datasets.models import Answer, ResponseCounter
+from questionnaire.models import (OptionValue, Question, Questionnaire,
+                                  SelectType)
+from upload.cache import LRUCache, _column_types, cached_classify_columns
+from upload.inference import (ColumnType, classify_columns,
+                              similarity_metrics)
+from upload.ingestion import bulk_create_answers
+from upload.jobs import (claim_next_job, reap_stale_jobs, run_job,
+                         send_heartbeats)
+from upload.models import UploadJob
+from upload.sheet import load_sheet
+from upload.views import UploadViewSet
 
 
 class UploadViewSetTestCase(APITestCase):
@@ -49,3 +78,490 @@ class UploadViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data["data"]["about"]["questions"]), 1)
         self.assertEqual(len(res.data["data"]["datasets"]), 5)
+
+
+class UploadJobTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            first_name="John",
+            last_name="Doe",
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.questionnaire = Questionnaire.objects.create(
+            title="Existing Questionnaire",
+            thumb="https://example.com/existing-thumb.jpg",
+            tags="tag1|tag4|tag5",
+            is_collecting=False,
+            is_public=True,
+            author=self.user,
+        )
+
+    def enqueue(self, kind="datasets"):
+        response = self.client.post(
+            f"/api/v1/upload/{kind}/",
+            {
+                "file": open("upload/datatests/file.xlsx", "rb"),
+                "questionnaire": self.questionnaire.id,
+                "background": "true",
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return response.data["data"]["id"]
+
+    def get_job(self, job_id):
+        response = self.client.get(f"/api/v1/upload/jobs/{job_id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["data"]
+
+    def test_enqueue_without_processing(self):
+        job = self.get_job(self.enqueue())
+
+        self.assertEqual(job["status"], UploadJob.STATUS_PENDING)
+        self.assertEqual(job["file_name"], "file.xlsx")
+        self.assertFalse(Question.objects.exists())
+
+    def test_worker_processes_job(self):
+        job_id = self.enqueue()
+        call_command("run_upload_jobs", once=True, stdout=StringIO())
+
+        job = self.get_job(job_id)
+        self.assertEqual(job["status"], UploadJob.STATUS_SUCCEEDED)
+        self.assertEqual(job["stage"], "done")
+        self.assertEqual(job["total_rows"], 5)
+        self.assertEqual(job["imported_rows"], 5)
+        self.assertEqual(job["num_questions"], 1)
+        self.assertEqual(job["num_answers"], 5)
+        self.assertIsNotNone(job["finish_at"])
+        self.assertIsNone(UploadJob.objects.get(pk=job_id).content)
+
+        res = self.client.get(
+            "/api/v1/datasets/" + self.questionnaire.slug + "/"
+        )
+        self.assertEqual(len(res.data["data"]["datasets"]), 5)
+
+    def test_failed_job_reports_error(self):
+        job_id = self.enqueue(kind="answer")
+        call_command(
+            "run_upload_jobs", once=True, stdout=StringIO(), stderr=StringIO()
+        )
+
+        job = self.get_job(job_id)
+        self.assertEqual(job["status"], UploadJob.STATUS_FAILED)
+        self.assertEqual(job["stage"], "answers")
+        self.assertEqual(
+            job["error"], "Answer not enough number of questions."
+        )
+        self.assertFalse(Answer.objects.exists())
+
+    def test_worker_fails_stale_jobs(self):
+        stale_id, beating_id = self.enqueue(), self.enqueue()
+        two_hours_ago = timezone.now() - timedelta(hours=2)
+        UploadJob.objects.filter(pk=stale_id).update(
+            status=UploadJob.STATUS_RUNNING,
+            start_at=two_hours_ago,
+            update_at=two_hours_ago,
+        )
+        # Long running, but its worker is still alive
+        UploadJob.objects.filter(pk=beating_id).update(
+            status=UploadJob.STATUS_RUNNING,
+            start_at=two_hours_ago,
+            update_at=timezone.now(),
+        )
+
+        call_command(
+            "run_upload_jobs",
+            once=True,
+            timeout=3600,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        stale = self.get_job(stale_id)
+        self.assertEqual(stale["status"], UploadJob.STATUS_FAILED)
+        self.assertEqual(stale["error"], "Upload job timed out.")
+        self.assertIsNotNone(stale["finish_at"])
+        self.assertIsNone(UploadJob.objects.get(pk=stale_id).content)
+        self.assertEqual(
+            self.get_job(beating_id)["status"], UploadJob.STATUS_RUNNING
+        )
+
+    def test_reaped_job_stays_failed(self):
+        job_id = self.enqueue()
+
+        def process(job, sheet, progress):
+            UploadJob.objects.filter(pk=job.pk).update(
+                update_at=timezone.now() - timedelta(hours=2)
+            )
+            self.assertEqual(reap_stale_jobs(3600), 1)
+
+        job = run_job(claim_next_job(), process)
+
+        self.assertEqual(job.status, UploadJob.STATUS_FAILED)
+        self.assertEqual(job.error, "Upload job timed out.")
+        self.assertEqual(
+            self.get_job(job_id)["status"], UploadJob.STATUS_FAILED
+        )
+
+    def test_anonymous_background_upload(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.post(
+            "/api/v1/upload/answer/",
+            {
+                "file": open("upload/datatests/file.xlsx", "rb"),
+                "questionnaire": self.questionnaire.id,
+                "background": "true",
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(UploadJob.objects.exists())
+
+    def test_job_of_another_user(self):
+        job_id = self.enqueue()
+        other = get_user_model().objects.create(
+            first_name="Jane",
+            last_name="Doe",
+            email="other@example.com",
+            password="testpassword",
+        )
+        self.client.force_authenticate(user=other)
+
+        response = self.client.get(f"/api/v1/upload/jobs/{job_id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UploadJobHeartbeatTestCase(TransactionTestCase):
+    def test_heartbeat_from_own_connection(self):
+        user = get_user_model().objects.create(
+            email="testuser@example.com", password="testpassword"
+        )
+        job = UploadJob.objects.create(
+            questionnaire=Questionnaire.objects.create(
+                title="Existing Questionnaire", author=user
+            ),
+            create_by=user,
+            kind=UploadJob.KIND_ANSWER,
+            status=UploadJob.STATUS_RUNNING,
+        )
+        last_beat = timezone.now() - timedelta(hours=2)
+        UploadJob.objects.filter(pk=job.pk).update(update_at=last_beat)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=send_heartbeats, args=(job.pk, stop, 0.01)
+        )
+        heartbeat.start()
+        time.sleep(0.1)
+        stop.set()
+        heartbeat.join()
+
+        job.refresh_from_db()
+        self.assertGreater(job.update_at, last_beat)
+
+
+class BulkCreateAnswersTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="testuser@example.com",
+            password="testpassword",
+        )
+        self.questionnaire = Questionnaire.objects.create(
+            title="Existing Questionnaire",
+            tags="tag1",
+            author=self.user,
+        )
+        self.question = Question.objects.create(
+            questionnaire=self.questionnaire,
+            type="SelectType",
+            label="Color?",
+            sequence=1,
+        )
+        select_type = SelectType.objects.create(
+            question_key=self.question.key, required=True
+        )
+        OptionValue.objects.create(select_type=select_type, value="Red")
+        OptionValue.objects.create(select_type=select_type, value="Blue")
+        self.questions = [
+            {
+                "key": str(self.question.key),
+                "type": "SelectType",
+                "question_detail": {
+                    "required": True,
+                    "multiselect": False,
+                    "other_field": False,
+                    "options": [{"value": "Red"}, {"value": "Blue"}],
+                },
+            }
+        ]
+
+    def test_skip_invalid_rows(self):
+        created = bulk_create_answers(
+            self.questionnaire.pk,
+            self.questions,
+            [("Red",), ("Green",), (None,), ("Blue",)],
+            answer_by=self.user,
+            batch_size=1,
+        )
+
+        self.assertEqual(created, 2)
+        self.assertEqual(
+            list(Answer.objects.values_list("code", "value")),
+            [(1, "Red"), (4, "Blue")],
+        )
+
+    def test_codes_follow_response_counter(self):
+        ResponseCounter.objects.create(
+            questionnaire=self.questionnaire, last_code=10
+        )
+        bulk_create_answers(
+            self.questionnaire.pk, self.questions, [("Red",), ("Blue",)]
+        )
+
+        self.assertEqual(
+            list(Answer.objects.values_list("code", flat=True)), [11, 12]
+        )
+        self.assertEqual(
+            ResponseCounter.objects.get(
+                questionnaire=self.questionnaire
+            ).last_code,
+            12,
+        )
+
+    def test_codes_reserved_before_insert(self):
+        def insert_answers(answers):
+            # The block is committed to the counter before any insert
+            self.assertEqual(
+                ResponseCounter.objects.get(
+                    questionnaire=self.questionnaire
+                ).last_code,
+                3,
+            )
+            return len(answers)
+
+        with mock.patch(
+            "upload.ingestion.allocate_codes", wraps=allocate_codes
+        ) as allocate, mock.patch(
+            "upload.ingestion.insert_answers", side_effect=insert_answers
+        ):
+            bulk_create_answers(
+                self.questionnaire.pk,
+                self.questions,
+                [("Red",), ("Blue",), ("Red",)],
+            )
+
+        allocate.assert_called_once_with(self.questionnaire.pk, 3)
+
+    def test_multiselect_other_field(self):
+        self.questions[0]["question_detail"].update(
+            {"multiselect": True, "other_field": True}
+        )
+        created = bulk_create_answers(
+            self.questionnaire.pk,
+            self.questions,
+            [("Red, Blue",), ("Red, Green",), ("Green, Pink",)],
+        )
+
+        self.assertEqual(created, 2)
+
+
+class SimilarityMetricsTestCase(SimpleTestCase):
+    def full_matrix_metrics(self, strings):
+        similarity_matrix = cosine_similarity(
+            TfidfVectorizer().fit_transform(strings)
+        )
+        return {
+            "similar_ratio": np.mean(similarity_matrix),
+            "mean_similar": np.count_nonzero(
+                np.isclose(similarity_matrix, 1, rtol=1e-2, atol=1e-2)
+            )
+            / similarity_matrix.size,
+            "mean_commas": np.mean([string.count(", ") for string in strings]),
+        }
+
+    def test_matches_full_matrix(self):
+        columns = [
+            ["Red", "Blue", "red", "Red", "Green"] * 7,
+            ["Red, Blue", "Blue", "Green, Red", "Red"] * 5,
+            ["I like it", "I like it a lot", "Not at all", "?", "ok"],
+            [f"Answer number {i}" for i in range(40)],
+        ]
+        for strings in columns:
+            expected = self.full_matrix_metrics(strings)
+            metrics = similarity_metrics(strings)
+            for name, value in expected.items():
+                self.assertAlmostEqual(metrics[name], value)
+
+    def test_sampled_column(self):
+        strings = [f"free text answer {i}" for i in range(50000)]
+        metrics = similarity_metrics(strings)
+
+        self.assertLess(metrics["mean_similar"], 0.25)
+        self.assertEqual(
+            UploadViewSet().check_question_type(strings), "InputType"
+        )
+
+    def test_fixture_column_types(self):
+        sheet = load_sheet(open("upload/datatests/file.xlsx", "rb"))
+        name_column = next(sheet.iter_cols(values_only=True))
+
+        self.assertEqual(
+            UploadViewSet().check_question_type(list(name_column[1:])),
+            "InputType",
+        )
+
+
+class ClassifyColumnTestCase(SimpleTestCase):
+    def setUp(self):
+        self.view = UploadViewSet()
+
+    def assertClassified(self, data, question_type, tier):
+        self.assertEqual(
+            self.view.classify_column(data), ColumnType(question_type, tier)
+        )
+
+    def test_tiers(self):
+        self.assertClassified(["1", "2", "2", "1"], "SelectType", "number")
+        self.assertClassified(
+            ["Yes", "No", "Yes"] * 10, "SelectType", "cardinality"
+        )
+        self.assertClassified(
+            ["Paris", "Hanoi", "Lima", "Oslo", "Rome"],
+            "InputType",
+            "cardinality",
+        )
+        self.assertClassified(
+            ["Red, Blue", "Blue, Green", "Green, Red", "Red", "Pink, Blue"],
+            "SelectType-multi",
+            "similarity",
+        )
+
+    def test_matches_similarity_model(self):
+        pools = [
+            ["Yes", "No", "Maybe"],
+            ["Paris", "Hanoi", "Lima", "Oslo", "Rome", "Cairo", "Quito"],
+            ["very good", "good", "bad", "very bad", "ok"],
+            ["Red, Blue", "Blue", "Green, Red", "Pink"],
+        ]
+        random = Random(0)
+        tiers = Counter()
+        for _ in range(200):
+            pool = random.choice(pools)
+            data = random.choices(
+                pool[: random.randint(1, len(pool))], k=random.randint(1, 30)
+            )
+
+            column_type = self.view.classify_column(data)
+            tiers[column_type.tier] += 1
+            self.assertEqual(
+                column_type.type, self.view.check_question_type(data)
+            )
+
+        self.assertGreater(tiers["cardinality"], tiers["similarity"])
+
+
+class ClassifyColumnsTestCase(SimpleTestCase):
+    def test_process_pool_keeps_column_order(self):
+        columns = [
+            ["Yes", "No", "Yes"] * 10,
+            ["1", "2", "3"],
+            ["Red, Blue", "Blue, Green", "Green, Red", "Red", "Pink, Blue"],
+            ["Paris", "Hanoi", "Lima", "Oslo", "Rome"],
+        ] * 3
+
+        self.assertEqual(
+            classify_columns(columns, workers=2),
+            classify_columns(columns),
+        )
+        self.assertEqual(
+            [column_type.type for column_type in classify_columns(columns)],
+            ["SelectType", "InputType", "SelectType-multi", "InputType"] * 3,
+        )
+
+
+class ColumnTypeCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        _column_types.clear()
+        cache.clear()
+        self.columns = [
+            ["Yes", "No", "Yes"] * 10,
+            ["Paris", "Hanoi", "Lima", "Oslo", "Rome"],
+            ["Yes", "No", "Yes"] * 10,
+        ]
+
+    def test_classify_distinct_columns_once(self):
+        with mock.patch(
+            "upload.cache.classify_columns", wraps=classify_columns
+        ) as classify:
+            first = cached_classify_columns(self.columns)
+            second = cached_classify_columns(self.columns[:2])
+
+        self.assertEqual(first, classify_columns(self.columns))
+        self.assertEqual(second, first[:2])
+        classify.assert_called_once_with(self.columns[:2], workers=1)
+
+    @override_settings(UPLOAD_SCHEMA_CACHE="default")
+    def test_persistent_cache(self):
+        expected = cached_classify_columns(self.columns)
+        _column_types.clear()
+
+        with mock.patch("upload.cache.classify_columns") as classify:
+            self.assertEqual(cached_classify_columns(self.columns), expected)
+        classify.assert_not_called()
+
+    def test_lru_eviction(self):
+        lru = LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+
+
+class LoadSheetTestCase(SimpleTestCase):
+    def make_file(self, rows):
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in rows:
+            sheet.append(row)
+        file = BytesIO()
+        workbook.save(file)
+        file.seek(0)
+        return file
+
+    def test_remove_empty_rows_and_columns(self):
+        file = self.make_file(
+            [
+                ["Name?", None, "Age?"],
+                [None, None, None],
+                ["Joseph", None, 20],
+                ["Nicole", None, None],
+            ]
+        )
+        sheet = load_sheet(file)
+
+        self.assertEqual(sheet.max_row, 3)
+        self.assertEqual(sheet.max_column, 2)
+        self.assertEqual(
+            list(sheet.iter_rows(values_only=True)),
+            [("Name?", "Age?"), ("Joseph", 20), ("Nicole", None)],
+        )
+        self.assertEqual(
+            list(sheet.iter_cols(values_only=True)),
+            [("Name?", "Joseph", "Nicole"), ("Age?", 20, None)],
+        )
+
+    def test_delete_cols(self):
+        sheet = load_sheet(self.make_file([["A", "B", "C"], [1, 2, 3]]))
+        sheet.delete_cols(1)
+
+        self.assertEqual(sheet.max_column, 2)
+        self.assertEqual(
+            list(sheet.iter_rows(values_only=True)), [("B", "C"), (2, 3)]
+        )
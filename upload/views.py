@@ -1,23 +1,34 @@
 import datetime
+from itertools import islice
 
-import numpy as np
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from openpyxl import load_workbook
 from rest_framework import status
 from rest_framework.decorators import action, parser_classes
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 from api.exceptions import (AnswerNotEnoughException,
+                            ColumnTypeMismatchException,
                             FileUploadRequireExcepion,
-                            QuestionnaireIdRequireExcepion)
+                            PermissionDeniedException,
+                            QuestionnaireIdRequireExcepion,
+                            UploadJobNotFoundException)
 from api.utils import ObjectResponse, StatusResponse, try_except_wrapper
-from datasets.serializer import AnswerSerializer
+from questionnaire.bulk import bulk_create_questions
 from questionnaire.models import Questionnaire
-from questionnaire.serializer import QuestionnaireSerializer
+from questionnaire.serializer import (QuestionnaireSerializer,
+                                      get_questionnaire_context)
 from questionnaire.views.views_question import QuestionViewSet
+from upload.cache import cached_classify_columns
+from upload.inference import (classify_column, is_number_input,
+                              number_column_type, similarity_metrics,
+                              similarity_type)
+from upload.ingestion import bulk_create_answers
+from upload.jobs import enqueue_upload_job
+from upload.models import UploadJob
+from upload.serializer import UploadJobSerializer
+from upload.sheet import load_sheet
 
 
 class UploadViewSet(QuestionViewSet):
@@ -41,12 +52,16 @@ class UploadViewSet(QuestionViewSet):
         if questionnaire is None:
             raise QuestionnaireIdRequireExcepion
 
-        workbook = load_workbook(file, data_only=True)
-        sheet = workbook.active
+        if self.is_background(request):
+            return self.enqueue(
+                request, UploadJob.KIND_QUESTION, file, questionnaire
+            )
 
-        self.remove_empty_rows_and_columns(sheet)
+        sheet = load_sheet(file)
 
-        self.handle_create_question_for_questionnaire(request, sheet)
+        self.handle_create_question_for_questionnaire(
+            sheet, questionnaire, request.user
+        )
 
         return Response(
             ObjectResponse(
@@ -57,39 +72,41 @@ class UploadViewSet(QuestionViewSet):
             status=status.HTTP_200_OK,
         )
 
-    def handle_create_question_for_questionnaire(self, request, sheet):
+    def handle_create_question_for_questionnaire(
+        self, sheet, questionnaire, user
+    ):
+        columns = []
         for idx, col in enumerate(sheet.iter_cols(values_only=True), start=1):
             if isinstance(col[1], datetime.datetime):
                 # Handle number datetime type
                 continue
+            columns.append((idx, col))
 
-            # print(idx)
-            self.handle_column_question(request, col, sequence=idx)
-        return True
+        column_types = self.classify_columns(
+            self.clean_column(col)[1:] for _, col in columns
+        )
 
-    def handle_column_question(self, request, data, sequence):
-        questionnaire = request.POST.get("questionnaire")
-        data_clean = tuple(item for item in data if item is not None)
+        questions = [
+            self.handle_column_question(
+                col,
+                questionnaire,
+                sequence=idx,
+                type_question=column_type.type,
+            )
+            for (idx, col), column_type in zip(columns, column_types)
+        ]
+
+        return len(bulk_create_questions(questions, user))
+
+    def handle_column_question(
+        self, data, questionnaire, sequence, type_question
+    ):
+        data_clean = self.clean_column(data)
 
         required = True
         if len(data) != len(data_clean):
             required = False
 
-        # Check number
-        data_clean = [str(x) if isinstance(x, int) else x for x in data_clean]
-
-        data_process = [item.split(", ") for item in data_clean[1:]]
-        flat_data = []
-        for sublist in data_process:
-            flat_data.extend(sublist)
-
-        if self.is_number_input(flat_data):
-            type_question = self.check_question_number_type(
-                data_process, flat_data
-            )
-        else:
-            type_question = self.check_question_type(data_clean[1:])
-
         # print(type_question)
         if type_question == "InputType":
             obj = self.process_InputType_object(
@@ -103,7 +120,7 @@ class UploadViewSet(QuestionViewSet):
             obj = self.process_SelectType_object(
                 data_clean, questionnaire, sequence, required, multi=True
             )
-        self.handle_create(request, obj)
+        return obj
 
     def process_InputType_object(
         self, data, questionnaire, sequence, required
@@ -169,12 +186,16 @@ class UploadViewSet(QuestionViewSet):
         if questionnaire is None:
             raise QuestionnaireIdRequireExcepion
 
-        workbook = load_workbook(file, data_only=True)
-        sheet = workbook.active
+        if self.is_background(request):
+            return self.enqueue(
+                request, UploadJob.KIND_ANSWER, file, questionnaire
+            )
 
-        self.remove_empty_rows_and_columns(sheet)
+        sheet = load_sheet(file)
 
-        self.handle_create_answer_for_dataset(request, sheet)
+        self.handle_create_answer_for_dataset(
+            sheet, questionnaire, request.user
+        )
 
         return Response(
             ObjectResponse(
@@ -205,13 +226,19 @@ class UploadViewSet(QuestionViewSet):
         if questionnaire is None:
             raise QuestionnaireIdRequireExcepion
 
-        workbook = load_workbook(file, data_only=True)
-        sheet = workbook.active
+        if self.is_background(request):
+            return self.enqueue(
+                request, UploadJob.KIND_DATASETS, file, questionnaire
+            )
 
-        self.remove_empty_rows_and_columns(sheet)
+        sheet = load_sheet(file)
 
-        self.handle_create_question_for_questionnaire(request, sheet)
-        self.handle_create_answer_for_dataset(request, sheet)
+        self.handle_create_question_for_questionnaire(
+            sheet, questionnaire, request.user
+        )
+        self.handle_create_answer_for_dataset(
+            sheet, questionnaire, request.user
+        )
 
         return Response(
             ObjectResponse(
@@ -222,9 +249,11 @@ class UploadViewSet(QuestionViewSet):
             status=status.HTTP_200_OK,
         )
 
-    def handle_create_answer_for_dataset(self, request, sheet):
-        questionnaire = request.POST.get("questionnaire")
-
+    def handle_create_answer_for_dataset(self, sheet, questionnaire, user):
+        """
+        Insert the answers of the sheet rows, return the number of answers
+        created
+        """
         first_column = None
         for col in sheet.iter_cols(values_only=True):
             first_column = col
@@ -236,8 +265,13 @@ class UploadViewSet(QuestionViewSet):
         # print(num_columns)
 
         # Get questionnaire from DB
-        instance = get_object_or_404(Questionnaire, pk=questionnaire)
-        serializer = QuestionnaireSerializer(instance)
+        instance = get_object_or_404(
+            Questionnaire.objects.prefetch_related("questions"),
+            pk=questionnaire,
+        )
+        serializer = QuestionnaireSerializer(
+            instance, context=get_questionnaire_context([instance])
+        )
         questionnaire_data = serializer.data
 
         # print(len(questionnaire_data["questions"]))
@@ -245,113 +279,112 @@ class UploadViewSet(QuestionViewSet):
             raise AnswerNotEnoughException
 
         # Check the data type of each column that does not match the question
-        for idx, col in enumerate(sheet.iter_cols(values_only=True), start=1):
-            data_clean = tuple(item for item in col if item is not None)
-            data_clean = [
-                str(x) if isinstance(x, int) else x for x in data_clean
-            ]
-            data_process = [item.split(", ") for item in data_clean[1:]]
-            flat_data = []
-            for sublist in data_process:
-                flat_data.extend(sublist)
-
-            if self.is_number_input(flat_data):
-                type_question = self.check_question_number_type(
-                    data_process, flat_data
-                )
-            else:
-                type_question = self.check_question_type(data_clean[1:])
-            data_type = type_question.split("-")[0]
+        columns = list(sheet.iter_cols(values_only=True))
+        column_types = self.classify_columns(
+            self.clean_column(col)[1:] for col in columns
+        )
+        for idx, (col, column_type) in enumerate(
+            zip(columns, column_types), start=1
+        ):
+            data_type = column_type.type.split("-")[0]
             question_type = questionnaire_data["questions"][idx - 1]["type"]
 
             if data_type != question_type:
-                return Response(
-                    ObjectResponse(
-                        StatusResponse.STATUS_SUCCESS,
-                        "Data type is not comfortable.",
-                        "Columns: " + col[0],
-                    ).get_json(),
-                    status=status.HTTP_200_OK,
+                raise ColumnTypeMismatchException(
+                    "Data type is not comfortable. Columns: " + str(col[0])
                 )
-        for code, row in enumerate(sheet.iter_rows(values_only=True), start=0):
-            if isinstance(col[1], datetime.datetime):
-                # Handle number datetime type
-                continue
 
-            if code == 0:  # Skip the first row
-                continue
+        return bulk_create_answers(
+            instance.pk,
+            questionnaire_data["questions"],
+            islice(sheet.iter_rows(values_only=True), 1, None),
+            answer_by=user,
+        )
 
-            isValid = True
-            data_save = []
-            for idx, item in enumerate(row, start=0):
-                question_type = questionnaire_data["questions"][idx]["type"]
-                # Check question is required but item is None
-                isValid = isValid and self.is_valid_answer_item_required(
-                    item, questionnaire_data["questions"][idx]
-                )
-                if item is not None and question_type == "SelectType":
-                    isValid = isValid and self.is_valid_answer_item_SelectType(
-                        item, questionnaire_data["questions"][idx]
-                    )
-                if isValid is False:
-                    break
-                data_save.append(
-                    {
-                        "questionnaire": questionnaire,
-                        "question_key": questionnaire_data["questions"][idx][
-                            "key"
-                        ],
-                        "value": item,
-                        "code": code,
-                    }
+    def process_upload_job(self, job, sheet, progress):
+        """
+        Run an UploadJob on its parsed sheet, as the matching upload action
+        would, reporting the stage and counts through `progress`
+        """
+        if job.kind in (UploadJob.KIND_QUESTION, UploadJob.KIND_DATASETS):
+            progress(stage="questions")
+            progress(
+                num_questions=self.handle_create_question_for_questionnaire(
+                    sheet, job.questionnaire_id, job.create_by
                 )
+            )
 
-            if isValid:
-                for item in data_save:
-                    answer_serializer = AnswerSerializer(data=item)
-                    answer_serializer.is_valid(raise_exception=True)
-                    answer_serializer.save(answer_by=request.user)
-
-    def is_valid_answer_item_SelectType(self, item, question):
-        item = str(item)
-        question_detail = question["question_detail"]
-        if question_detail["multiselect"]:  # multiselect
-            options_list = question_detail["options"]
-            item_list = item.split(", ")
-
-            for e in options_list:
-                if e["value"] in item_list:
-                    item_list.remove(e["value"])
-
-            if (
-                question_detail["other_field"] is False and len(item_list) > 0
-            ) or (question_detail["other_field"] and len(item_list) > 1):
-                return False
-        elif (  # singleselect
-            question_detail["multiselect"] is False
-            and question_detail["other_field"] is False
-            and not any(e["value"] == item for e in question_detail["options"])
-        ):
-            return False
+        if job.kind in (UploadJob.KIND_ANSWER, UploadJob.KIND_DATASETS):
+            progress(stage="answers")
+            num_answers = self.handle_create_answer_for_dataset(
+                sheet, job.questionnaire_id, job.create_by
+            )
+            progress(
+                num_answers=num_answers,
+                imported_rows=num_answers // max(sheet.max_column, 1),
+            )
 
-        return True
+    @action(
+        methods=["GET"],
+        url_path=r"jobs/(?P<job_id>\d+)",
+        url_name="upload_job",
+        detail=False,
+    )
+    @try_except_wrapper
+    def retrieve_job(self, request, job_id):
+        """
+        STATUS OF AN UPLOAD JOB
+        """
+        if not request.user.is_authenticated:
+            raise PermissionDeniedException
+
+        job = UploadJob.objects.filter(
+            pk=job_id, create_by=request.user
+        ).first()
+        if job is None:
+            raise UploadJobNotFoundException
+
+        return Response(
+            ObjectResponse(
+                StatusResponse.STATUS_SUCCESS,
+                "Get upload job successfully.",
+                UploadJobSerializer(job).data,
+            ).get_json(),
+            status=status.HTTP_200_OK,
+        )
+
+    def is_background(self, request):
+        """
+        Uploads posted with background=true are processed by the
+        run_upload_jobs worker instead of the request
+        """
+        return request.POST.get("background", "").lower() in ("1", "true")
+
+    def enqueue(self, request, kind, file, questionnaire):
+        # Jobs belong to their creator, who polls them from retrieve_job
+        if not request.user.is_authenticated:
+            raise PermissionDeniedException
 
-    def is_valid_answer_item_required(self, item, question):
-        question_detail = question["question_detail"]
-        if item is None and question_detail["required"]:
-            return False
-        return True
+        instance = get_object_or_404(Questionnaire, pk=questionnaire)
+        if kind != UploadJob.KIND_ANSWER and instance.author != request.user:
+            raise PermissionDeniedException
+
+        job = enqueue_upload_job(kind, file, instance, request.user)
+
+        return Response(
+            ObjectResponse(
+                StatusResponse.STATUS_SUCCESS,
+                "Upload job created successfully.",
+                UploadJobSerializer(job).data,
+            ).get_json(),
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    def classify_column(self, data):
+        return classify_column(data)
 
     def check_question_type(self, data):
-        result = self.calculate_similarity(data)
-        # print(result)
-        if result["mean_similar"] >= 0.25:
-            return "SelectType"
-        else:
-            if result["similar_ratio"] >= 0.4:
-                return "SelectType-multi"
-            else:
-                return "InputType"
+        return similarity_type(data)
 
     def calculate_similarity(self, strings):
         """
@@ -365,79 +398,38 @@ class UploadViewSet(QuestionViewSet):
 
         Cosine Similarity is a measure of similarity between
         two non-zero vectors in an inner product space.
-        """
-        vectorizer = TfidfVectorizer()
-
-        commas_count = [string.count(", ") for string in strings]
-        commas_count = np.sum(commas_count)
-
-        tfidf_matrix = vectorizer.fit_transform(strings)
 
-        similarity_matrix = cosine_similarity(tfidf_matrix)
-
-        num_ones = np.count_nonzero(
-            np.isclose(similarity_matrix, 1, rtol=1e-2, atol=1e-2)
-        )
-        num_elements = similarity_matrix.shape[0] * similarity_matrix.shape[1]
-
-        return {
-            "similar_ratio": np.mean(similarity_matrix),
-            "mean_similar": num_ones / num_elements,
-            "mean_commas": commas_count / len(strings),
-        }
-
-    def is_convertible_to_int(self, s):
-        """
-        Check a string can be convert to int
+        The metrics are computed over the distinct values of the column
+        (see upload.inference), so the cost does not grow with the rows.
         """
-        try:
-            int(s)
-            return True
-        except ValueError:
-            return False
+        return similarity_metrics(strings)
 
     def is_number_input(self, data):
         """
         Check data is a number type
         """
-        for item in data:
-            if self.is_convertible_to_int(item) is False:
-                return False
-        return True
+        return is_number_input(data)
 
     def check_question_number_type(self, data, flat_data):
-        for item in data:
-            if len(item) > 1:
-                return "SelectType-multi"
-
-        unique_values, counts = np.unique(flat_data, return_counts=True)
-        total_frequency = np.sum(counts)
-
-        # Tính trung bình tần số xuất hiện
-        mean_frequency = total_frequency / len(counts)
-        print(mean_frequency)
-        if mean_frequency <= 1.5:
-            return "InputType"
-        return "SelectType"
-
-    def remove_empty_rows_and_columns(self, sheet):
-        rows_to_remove = []
-        cols_to_remove = []
-
-        for row_idx, row in enumerate(
-            sheet.iter_rows(min_row=1, values_only=True), start=1
-        ):
-            if all(cell is None for cell in row):
-                rows_to_remove.append(row_idx)
-
-        for col_idx, col in enumerate(
-            sheet.iter_cols(min_col=1, values_only=True), start=1
-        ):
-            if all(cell is None for cell in col):
-                cols_to_remove.append(col_idx)
+        return number_column_type(data, flat_data)
 
-        for row_idx in reversed(rows_to_remove):
-            sheet.delete_rows(row_idx)
+    def classify_columns(self, columns):
+        """
+        Question types of the cleaned columns, in order, taken from the
+        column type cache or classified by UPLOAD_INFERENCE_WORKERS
+        processes
+        """
+        return cached_classify_columns(
+            columns,
+            workers=getattr(settings, "UPLOAD_INFERENCE_WORKERS", 1),
+        )
 
-        for col_idx in reversed(cols_to_remove):
-            sheet.delete_cols(col_idx)
+    def clean_column(self, data):
+        """
+        Cells of a column without the empty ones, numbers as strings
+        """
+        return [
+            str(item) if isinstance(item, int) else item
+            for item in data
+            if item is not None
+        ]